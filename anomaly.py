@@ -0,0 +1,83 @@
+# anomaly.py
+
+import os
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+ANOMALY_DETECTION    = os.getenv("ANOMALY_DETECTION", "false").lower() == "true"
+# Flag a price this many robust standard deviations below its usual price...
+ANOMALY_Z            = float(os.getenv("ANOMALY_Z", "6"))
+# ...and at least this many percent below it.
+ANOMALY_MIN_DROP_PCT = float(os.getenv("ANOMALY_MIN_DROP_PCT", "70"))
+# Earlier observations needed before an ASIN is scored, and the most used.
+ANOMALY_MIN_POINTS   = int(os.getenv("ANOMALY_MIN_POINTS", "5"))
+ANOMALY_WINDOW       = int(os.getenv("ANOMALY_WINDOW", "720"))
+# A flat history has no spread; treat it as at least this share of the
+# median so a few cents' change doesn't score as a huge deviation.
+MIN_SPREAD = 0.01
+MAD_SCALE  = 1.4826    # MAD → standard deviation for normal data
+
+# ─── Robust scoring ────────────────────────────────────────────────────────────
+# A batch of offers (one category page in the hourly run) is scored in one
+# pass: every scored offer's history is concatenated into a single array of
+# cents, segment ids say which offer each value belongs to, and one sort of
+# (segment, value) keys orders every segment at once, so medians are plain
+# index lookups. The usual price is the median of the history, the spread
+# its median absolute deviation, and the score
+#   z = (usual - price) / (MAD_SCALE · MAD)
+# which outliers in the history (earlier errors, one-off sales) barely move.
+# No list price is needed.
+SEG_SHIFT = 34         # values below 2**34 (doubled cents) fit under the segment id
+
+
+def segment_medians2(values: np.ndarray, seg: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Twice the median of each segment, exact in integers; values are
+    # non-negative int64, seg is sorted and every count is at least one.
+    ordered = np.sort((seg << SEG_SHIFT) | values) & ((1 << SEG_SHIFT) - 1)
+    starts = np.cumsum(counts) - counts
+    return ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]
+
+
+def score(histories: list, prices) -> tuple:
+    # (usual, z, drop %) arrays, one entry per history (sale prices in
+    # cents) and current price pair.
+    counts = np.fromiter((len(h) for h in histories), dtype=np.int64, count=len(histories))
+    if not len(counts):
+        return np.empty(0), np.empty(0), np.empty(0)
+    values = np.concatenate([np.asarray(h, dtype=np.int64) for h in histories])
+    seg = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    prices = np.asarray(prices, dtype=np.float64)
+
+    usual2 = segment_medians2(values, seg, counts)
+    mad4 = segment_medians2(np.abs(2 * values - usual2[seg]), seg, counts)
+    usual = usual2 / 2
+    spread = np.maximum(MAD_SCALE * mad4 / 4, MIN_SPREAD * usual)
+    with np.errstate(divide="ignore", invalid="ignore"):     # a usual price of $0 never flags
+        z = (usual - prices) / spread
+        drop = (usual - prices) / usual * 100
+    return usual, z, drop
+
+
+def detect(offers: list, store) -> list:
+    # (offer, usual price, drop %) for every offer priced far below its
+    # own history in the PriceStore, most anomalous first.
+    started = time.perf_counter()
+    scored, histories = [], []
+    for offer in offers:
+        history = store.sales(offer["asin"], last=ANOMALY_WINDOW)
+        if len(history) >= ANOMALY_MIN_POINTS:
+            scored.append(offer)
+            histories.append(history)
+    usual, z, drop = score(histories, [o["sale_price"] * 100 for o in scored])
+
+    hits = np.flatnonzero((z >= ANOMALY_Z) & (drop >= ANOMALY_MIN_DROP_PCT))
+    hits = hits[np.argsort(-z[hits], kind="stable")]
+    flagged = [(scored[i], usual[i] / 100, float(drop[i])) for i in hits]
+    unlisted = sum(1 for o, _, _ in flagged if o["orig_price"] is None)
+    logger.info(f"Anomaly detector: scored {len(scored)} of {len(offers)} offers, flagged {len(flagged)} "
+                f"({unlisted} without a list price) in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return flagged
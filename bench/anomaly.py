@@ -0,0 +1,57 @@
+# bench/anomaly.py
+#
+# Time to score a batch of offers against their price histories: the
+# vectorized pass in anomaly.score against a per-offer loop over the same
+# histories (int cents, as PriceStore keeps them) with the statistics module,
+# on random data.
+#   python -m bench.anomaly [--offers 5000] [--points 720]
+
+import time
+import random
+import argparse
+import statistics
+from array import array
+import numpy as np
+import anomaly
+
+
+def score_loop(histories, prices):
+    usual, z, drop = [], [], []
+    for history, price in zip(histories, prices):
+        med = statistics.median(history)
+        mad = statistics.median(abs(v - med) for v in history)
+        spread = max(anomaly.MAD_SCALE * mad, anomaly.MIN_SPREAD * med)
+        usual.append(med)
+        z.append((med - price) / spread)
+        drop.append((med - price) / med * 100)
+    return usual, z, drop
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--offers", type=int, default=5000)
+    ap.add_argument("--points", type=int, default=720, help="maximum history length per offer")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    histories, prices = [], []
+    for _ in range(args.offers):
+        base = rng.randint(500, 50000)
+        histories.append(array("i", (round(base * rng.uniform(0.9, 1.1))
+                                     for _ in range(rng.randint(anomaly.ANOMALY_MIN_POINTS, args.points)))))
+        prices.append(base * (0.05 if rng.random() < 0.01 else rng.uniform(0.85, 1.05)))
+    print(f"{args.offers} offers, {sum(map(len, histories)):,} history points")
+
+    results = {}
+    for name, fn in (("numpy", anomaly.score), ("loop", score_loop)):
+        start = time.perf_counter()
+        results[name] = fn(histories, prices)
+        elapsed = (time.perf_counter() - start) * 1000
+        flagged = int(np.count_nonzero((np.asarray(results[name][1]) >= anomaly.ANOMALY_Z)
+                                       & (np.asarray(results[name][2]) >= anomaly.ANOMALY_MIN_DROP_PCT)))
+        print(f"{name:<6} {elapsed:9.1f} ms  flagged {flagged}")
+    same = all(np.allclose(a, b) for a, b in zip(results["numpy"], results["loop"]))
+    print("same scores" if same else "SCORES DIFFER")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# bench/corpus.py
+#
+# Stored search-result pages for offline benchmarks. Drop saved amazon.ca
+# pages (.html or .html.gz) into bench/fixtures/ next to the synthetic ones.
+#   python -m bench.corpus --out bench/fixtures --pages 4 --cards 48
+
+import os
+import gzip
+import argparse
+from bench.synthetic import make_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_corpus(path: str = FIXTURES_DIR) -> list:
+    pages = []
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if name.endswith(".html.gz"):
+            with gzip.open(full, "rt", encoding="utf-8") as f:
+                pages.append((name, f.read()))
+        elif name.endswith(".html"):
+            with open(full, encoding="utf-8") as f:
+                pages.append((name, f.read()))
+    return pages
+
+
+def synthetic_corpus(n_pages: int, n_cards: int) -> list:
+    return [(f"synthetic-{i}", make_page(n_cards, seed=i)) for i in range(n_pages)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=FIXTURES_DIR)
+    ap.add_argument("--pages", type=int, default=4)
+    ap.add_argument("--cards", type=int, default=48)
+    args = ap.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for i in range(args.pages):
+        path = os.path.join(args.out, f"synthetic-{args.cards}-{i}.html.gz")
+        with gzip.GzipFile(path, "wb", mtime=0) as f:
+            f.write(make_page(args.cards, seed=1000 + i).encode("utf-8"))
+        print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
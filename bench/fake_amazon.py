@@ -0,0 +1,184 @@
+# bench/fake_amazon.py
+#
+# Local stand-in for amazon.ca. Every path is served as a search-result page
+# generated from bench.synthetic (seeded by the path, so a category always
+# returns the same cards), /dp/<ASIN> serves a product page, /product/<ASIN>
+# a camelcamelcamel-style price history (for CAMEL_BASE_URL), and latency,
+# errors and 503 robot checks can be dialled in. Point the scrapers at it with
+# AMAZON_BASE_URL=http://127.0.0.1:8800.
+#   python -m bench.fake_amazon [--port 8800] [--latency-ms 150] [--error-rate 0.02] [--robot-rate 0.01]
+
+import re
+import json
+import time
+import random
+import zlib
+import argparse
+import threading
+from html import escape
+from functools import lru_cache
+from urllib.parse import urlsplit, parse_qs, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from bench.synthetic import make_page, _title
+
+ROBOT_CHECK_PAGE = """<!doctype html><html><head><title>Amazon.ca</title></head><body>
+<div class="a-container a-padding-double-large"><div class="a-row a-spacing-double-large">
+<h4>Enter the characters you see below</h4>
+<p class="a-last">Sorry, we just need to make sure you're not a robot. For best results, please make sure your browser is accepting cookies.</p>
+<form method="get" action="/errors/validateCaptcha" name=""><input type=hidden name="amzn" value="x"/>
+<div class="a-row a-text-center"><img src="https://images-na.ssl-images-amazon.com/captcha/abc/Captcha_xyz.jpg"></div>
+</form></div></div>
+<!-- To discuss automated access to Amazon data please contact api-services-support@amazon.com. -->
+</body></html>"""
+
+PRODUCT_PAGE = """<!doctype html><html lang="en-ca"><head><meta charset="utf-8"><title>Amazon.ca: {title}</title></head>
+<body><div id="dp" class="a-container"><div id="dp-container" class="a-container" role="main">
+<div id="centerCol" class="centerColAlign"><div id="title_feature_div" class="celwidget">
+<h1 id="title" class="a-size-large a-spacing-none"><span id="productTitle" class="a-size-large product-title-word-break">        {title}       </span></h1></div>
+<div id="corePriceDisplay_desktop_feature_div" class="celwidget"><div class="a-section a-spacing-none aok-align-center aok-relative">
+<span class="aok-offscreen">${price}</span><span class="a-price aok-align-center reinventPricePriceToPayMargin priceToPay" data-a-size="xl" data-a-color="base"><span class="a-offscreen">${price}</span><span aria-hidden="true"><span class="a-price-symbol">$</span><span class="a-price-whole">{whole}<span class="a-price-decimal">.</span></span><span class="a-price-fraction">{frac}</span></span></span>
+</div><div class="a-section a-spacing-small aok-align-center"><span class="a-size-small a-color-secondary aok-align-center basisPrice">List Price: <span class="a-price a-text-price" data-a-size="s" data-a-strike="true" data-a-color="secondary"><span class="a-offscreen">${list_price}</span><span aria-hidden="true">${list_price}</span></span></span></div></div>
+<div id="availability" class="a-section a-spacing-base"><span class="a-size-medium a-color-success">   {availability}   </span></div>
+</div></div></div></body></html>"""
+
+CAMEL_PAGE = """<!doctype html><html><head><title>{asin} price history</title></head><body>
+<div class="row"><div class="stat lowest"><span class="label">Lowest</span> <span class="value">${lowest}</span></div>
+<div class="stat average"><span class="label">Average</span> <span class="value">${average}</span></div></div>
+</body></html>"""
+
+RE_DP      = re.compile(r"^/(?:[^/]+/)?dp/([A-Z0-9]{10})")
+RE_PRODUCT = re.compile(r"^/product/([A-Z0-9]{10})")
+
+
+@lru_cache(maxsize=4096)
+def category_page(key: str, page: int, cards: int, pages: int, error_rate: float) -> bytes:
+    if page > pages:
+        return make_page(0, seed=zlib.crc32(key.encode())).encode()
+    html = make_page(cards, seed=zlib.crc32(f"{key}#{page}".encode()), error_rate=error_rate)
+    if page < pages:
+        nxt = f'<a href="{escape(key)}&amp;page={page + 1}" class="s-pagination-item s-pagination-next">Next</a>'
+        html = html.replace("</body>", f"<span class=\"s-pagination-strip\">{nxt}</span></body>")
+    return html.encode()
+
+
+@lru_cache(maxsize=4096)
+def product_page(asin: str) -> bytes:
+    rng = random.Random(asin)
+    list_price = rng.uniform(15, 900)
+    price = list_price * (rng.uniform(0.02, 0.09) if rng.random() < 0.2 else rng.uniform(0.5, 0.95))
+    return PRODUCT_PAGE.format(
+        title=escape(_title(rng)),
+        price=f"{price:,.2f}", whole=f"{int(price):,}", frac=f"{price:.2f}"[-2:],
+        list_price=f"{list_price:,.2f}",
+        availability="In Stock" if rng.random() < 0.9 else "Currently unavailable.",
+    ).encode()
+
+
+@lru_cache(maxsize=4096)
+def camel_page(asin: str) -> bytes:
+    rng = random.Random(asin + "#history")
+    average = rng.uniform(15, 900)
+    return CAMEL_PAGE.format(asin=asin, lowest=f"{average * rng.uniform(0.5, 0.9):,.2f}",
+                             average=f"{average:,.2f}").encode()
+
+
+class FakeAmazon(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency_ms=0.0, error_rate=0.0, robot_rate=0.0,
+                 cards=48, pages=1, deal_rate=0.1, seed=0):
+        super().__init__(addr, Handler)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.robot_rate = robot_rate
+        self.cards = cards
+        self.pages = pages
+        self.deal_rate = deal_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "200": 0, "500": 0, "503": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll(self) -> tuple:
+        with self.lock:
+            return self.rng.random(), self.rng.random()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status: int, body: bytes, ctype: str = "text/html;charset=UTF-8"):
+        srv = self.server
+        with srv.lock:
+            srv.stats["requests"] += 1
+            srv.stats[str(status)] = srv.stats.get(str(status), 0) + 1
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        srv = self.server
+        jitter, fate = srv.roll()
+        if srv.latency_ms:
+            time.sleep(srv.latency_ms * (0.5 + jitter) / 1000)
+
+        if self.path == "/__stats":
+            return self.send(200, json.dumps(srv.stats).encode(), "application/json")
+        if fate < srv.robot_rate:
+            return self.send(503, ROBOT_CHECK_PAGE.encode())
+        if fate < srv.robot_rate + srv.error_rate:
+            return self.send(500, b"<html><body>Internal Server Error</body></html>")
+
+        parts = urlsplit(self.path)
+        m = RE_DP.match(parts.path)
+        if m:
+            return self.send(200, product_page(m.group(1)))
+        m = RE_PRODUCT.match(parts.path)
+        if m:
+            return self.send(200, camel_page(m.group(1)))
+
+        query = parse_qs(parts.query)
+        page = int(query.pop("page", ["1"])[0])
+        query.pop("sort", None)
+        key = parts.path + "?" + urlencode(query, doseq=True)
+        self.send(200, category_page(key, page, srv.cards, srv.pages, srv.deal_rate))
+
+
+def category_paths(n: int) -> list:
+    return [f"/b?node={10_000_000 + i}" for i in range(n)]
+
+
+def serve_in_thread(port: int = 0, **kw) -> FakeAmazon:
+    srv = FakeAmazon(("127.0.0.1", port), **kw)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8800)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--robot-rate", type=float, default=0.0)
+    ap.add_argument("--cards", type=int, default=48)
+    ap.add_argument("--pages", type=int, default=1, help="result pages per category")
+    ap.add_argument("--deal-rate", type=float, default=0.1, help="share of cards priced as errors")
+    args = ap.parse_args()
+
+    srv = FakeAmazon(("127.0.0.1", args.port), args.latency_ms, args.error_rate, args.robot_rate,
+                     args.cards, args.pages, args.deal_rate)
+    print(f"fake amazon.ca on {srv.base_url}")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# bench/fake_telegram.py
+#
+# Local stand-in for the Telegram Bot API. Records every sendMessage and
+# enforces Telegram-like flood limits with token buckets: a global bucket
+# (~30 msg/s), one per private chat (~1 msg/s) and one per group/channel
+# (~20 msg/min). Over-limit calls get the real 429 body with retry_after,
+# which python-telegram-bot raises as RetryAfter. Point the bots at it with
+# TELEGRAM_API_URL=http://127.0.0.1:8801.
+#   python -m bench.fake_telegram [--port 8801] [--global-rate 30] [--chat-rate 1] [--group-rate 0.33]
+
+import re
+import json
+import math
+import time
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RE_METHOD = re.compile(r"^/bot[^/]+/(\w+)")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def wait(self) -> float:
+        # Seconds until a token is available (0 when one is ready now).
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, global_rate=30.0, chat_rate=1.0, group_rate=20 / 60, burst=3):
+        super().__init__(addr, Handler)
+        self.global_bucket = TokenBucket(global_rate, max(burst, global_rate))
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.chat_buckets = {}
+        self.chat_ids = {}
+        self.lock = threading.Lock()
+        self.messages = []
+        self.stats = {"requests": 0, "sent": 0, "429": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def resolve_chat(self, chat_id: str) -> int:
+        if chat_id.lstrip("-").isdigit():
+            return int(chat_id)
+        # @channelname → a stable fake channel-style id
+        with self.lock:
+            return self.chat_ids.setdefault(chat_id, -1001000000000 - len(self.chat_ids))
+
+    def admit(self, chat: int) -> float:
+        with self.lock:
+            bucket = self.chat_buckets.get(chat)
+            if bucket is None:
+                rate = self.chat_rate if chat > 0 else self.group_rate
+                bucket = self.chat_buckets[chat] = TokenBucket(rate, self.burst if chat > 0 else 1)
+            wait = max(self.global_bucket.wait(), bucket.wait())
+            if wait:
+                self.stats["429"] += 1
+            else:
+                self.global_bucket.tokens -= 1
+                bucket.tokens -= 1
+            return wait
+
+    def record(self, chat: int, params: dict) -> dict:
+        with self.lock:
+            msg = {
+                "message_id": len(self.messages) + 1,
+                "date":       int(time.time()),
+                "chat":       {"id": chat, "type": "private" if chat > 0 else "channel"},
+                "text":       params.get("text", ""),
+            }
+            self.messages.append({**msg, "received": time.time()})
+            self.stats["sent"] += 1
+            return msg
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def params(self) -> dict:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        ctype = self.headers.get("Content-Type", "")
+        if ctype.startswith("application/json"):
+            return json.loads(raw or b"{}")
+        return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+    def do_GET(self):
+        if self.path == "/__stats":
+            srv = self.server
+            with srv.lock:
+                return self.reply(200, {**srv.stats, "messages": srv.messages})
+        self.do_POST()
+
+    def do_POST(self):
+        srv = self.server
+        m = RE_METHOD.match(self.path)
+        params = self.params() if self.command == "POST" else {}
+        with srv.lock:
+            srv.stats["requests"] += 1
+        if not m:
+            return self.reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+        method = m.group(1)
+
+        if method == "getMe":
+            return self.reply(200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}})
+        if method == "getUpdates":
+            time.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+            return self.reply(200, {"ok": True, "result": []})
+        if method != "sendMessage":
+            return self.reply(200, {"ok": True, "result": True})
+
+        chat = srv.resolve_chat(str(params.get("chat_id", "")))
+        wait = srv.admit(chat)
+        if wait:
+            retry_after = max(1, math.ceil(wait))
+            return self.reply(429, {"ok": False, "error_code": 429,
+                                    "description": f"Too Many Requests: retry after {retry_after}",
+                                    "parameters": {"retry_after": retry_after}})
+        self.reply(200, {"ok": True, "result": srv.record(chat, params)})
+
+
+def serve_in_thread(port: int = 0, **kw) -> FakeTelegram:
+    srv = FakeTelegram(("127.0.0.1", port), **kw)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8801)
+    ap.add_argument("--global-rate", type=float, default=30.0, help="messages/s across all chats")
+    ap.add_argument("--chat-rate", type=float, default=1.0, help="messages/s per private chat")
+    ap.add_argument("--group-rate", type=float, default=20 / 60, help="messages/s per group or channel")
+    args = ap.parse_args()
+
+    srv = FakeTelegram(("127.0.0.1", args.port), args.global_rate, args.chat_rate, args.group_rate)
+    print(f"fake Telegram Bot API on {srv.base_url}")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench/load_notify.py
+#
+# Full run_and_notify load test, offline: the hourly scraper crawls
+# bench.fake_amazon (which also answers the camelcamelcamel lookups) and
+# posts to bench.fake_telegram. Reports delivered messages/s, delivery
+# latency from the start of the run, and the 429s the flood limits handed out.
+# Runs in a scratch directory so seen.json in the checkout is untouched.
+#   python -m bench.load_notify [--categories 100] [--deal-rate 0.05] [--global-rate 30]
+
+import os
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+from bench.fake_amazon import category_paths
+from bench.servers import spawn, stats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categories", type=int, default=100)
+    ap.add_argument("--cards", type=int, default=48)
+    ap.add_argument("--deal-rate", type=float, default=0.05)
+    ap.add_argument("--latency-ms", type=float, default=100.0)
+    ap.add_argument("--global-rate", type=float, default=30.0)
+    ap.add_argument("--group-rate", type=float, default=20 / 60)
+    ap.add_argument("--amazon-port", type=int, default=8800)
+    ap.add_argument("--telegram-port", type=int, default=8801)
+    args = ap.parse_args()
+
+    procs = [
+        spawn("bench.fake_amazon", args.amazon_port, "--latency-ms", args.latency_ms,
+              "--cards", args.cards, "--deal-rate", args.deal_rate),
+        spawn("bench.fake_telegram", args.telegram_port, "--global-rate", args.global_rate,
+              "--group-rate", args.group_rate),
+    ]
+    workdir = tempfile.mkdtemp(prefix="load_notify-")
+    try:
+        os.environ["AMAZON_BASE_URL"] = f"http://127.0.0.1:{args.amazon_port}"
+        os.environ["CAMEL_BASE_URL"] = f"http://127.0.0.1:{args.amazon_port}"
+        os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{args.telegram_port}"
+        os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench-offline")
+        import scrape_and_notify
+        logging.getLogger().setLevel(logging.WARNING)
+        scrape_and_notify.CATEGORY_PATHS = category_paths(args.categories)
+
+        os.chdir(workdir)
+        start_wall = time.time()
+        start = time.perf_counter()
+        error = None
+        try:
+            asyncio.run(scrape_and_notify.run_and_notify())
+        except Exception as e:
+            error = e
+        elapsed = time.perf_counter() - start
+
+        tg = stats(args.telegram_port)
+        latencies = [m["received"] - start_wall for m in tg["messages"]]
+        print(f"run took {elapsed:.2f}s, {tg['sent']} messages delivered, {tg['429']} x 429")
+        if latencies:
+            span = max(latencies) - min(latencies)
+            rate = len(latencies) / span if span > 0 else float("inf")
+            print(f"delivery latency from run start: first {min(latencies):.2f}s, "
+                  f"median {statistics.median(latencies):.2f}s, last {max(latencies):.2f}s; "
+                  f"{rate:.1f} msg/s while sending")
+        if error:
+            print(f"run aborted: {type(error).__name__}: {error}")
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# bench/load_scrape.py
+#
+# End-to-end crawl load test against bench.fake_amazon, fully offline.
+# Starts the fake server in its own process, points the hourly scraper at it
+# through AMAZON_BASE_URL and crawls N generated category paths.
+#   python -m bench.load_scrape [--categories 300] [--latency-ms 200] [--robot-rate 0.01]
+
+import os
+import time
+import asyncio
+import logging
+import argparse
+from bench.fake_amazon import category_paths
+from bench.servers import spawn, stats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--categories", type=int, default=300)
+    ap.add_argument("--cards", type=int, default=48)
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--robot-rate", type=float, default=0.0)
+    ap.add_argument("--port", type=int, default=8800)
+    args = ap.parse_args()
+
+    proc = spawn("bench.fake_amazon", args.port, "--latency-ms", args.latency_ms,
+                 "--error-rate", args.error_rate, "--robot-rate", args.robot_rate, "--cards", args.cards)
+    try:
+        base = f"http://127.0.0.1:{args.port}"
+        os.environ["AMAZON_BASE_URL"] = base
+        os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench-offline")
+        import scrape_and_notify
+        logging.getLogger().setLevel(logging.WARNING)
+        scrape_and_notify.CATEGORY_PATHS = category_paths(args.categories)
+
+        start = time.perf_counter()
+        deals = asyncio.run(scrape_and_notify.scrape_deals())
+        elapsed = time.perf_counter() - start
+
+        print(f"{args.categories} categories in {elapsed:.2f}s "
+              f"({args.categories / elapsed:.1f} pages/s), {len(deals)} deals")
+        print(f"server: {stats(args.port)}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
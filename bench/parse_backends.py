@@ -0,0 +1,57 @@
+# bench/parse_backends.py
+#
+# Parse time per page for each HTML_PARSER backend, on synthetic pages.
+#   python -m bench.parse_backends [--pages 20] [--cards 48]
+
+import gc
+import time
+import argparse
+import tracemalloc
+import parsers
+from parsers import BACKENDS, extract_cards
+from bench.synthetic import make_page
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--cards", type=int, default=48)
+    args = ap.parse_args()
+
+    pages = [make_page(args.cards, seed=i) for i in range(args.pages)]
+    size_kb = sum(len(p) for p in pages) / len(pages) / 1024
+    print(f"{args.pages} pages, {args.cards} cards/page, {size_kb:.0f} KB/page")
+
+    baseline = None
+    for name in BACKENDS:
+        try:
+            extract_cards(pages[0], name)
+        except RuntimeError as e:
+            print(f"{name:<12} skipped ({e})")
+            continue
+        start = time.perf_counter()
+        results = [extract_cards(p, name) for p in pages]
+        per_page = (time.perf_counter() - start) / len(pages) * 1000
+        if baseline is None:
+            baseline = results
+            match = "baseline"
+        else:
+            match = "same cards" if results == baseline else "CARDS DIFFER"
+        print(f"{name:<12} {per_page:8.2f} ms/page  {match}")
+
+    # Strained vs full-tree BeautifulSoup: time, and peak Python heap for one page.
+    for results_only in (True, False):
+        label = "bs4 strained" if results_only else "bs4 full"
+        start = time.perf_counter()
+        for p in pages:
+            parsers._cards_bs4(p, results_only)
+        per_page = (time.perf_counter() - start) / len(pages) * 1000
+        gc.collect()
+        tracemalloc.start()
+        parsers._cards_bs4(pages[0], results_only)
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        print(f"{label:<12} {per_page:8.2f} ms/page  peak {peak:,.0f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# bench/parse_product.py
+#
+# Parse time per /dp/ product page: the regex fast path against bs4 on the
+# buy-box sections only and bs4 on the whole page, on synthetic pages.
+#   python -m bench.parse_product [--pages 50] [--related 24]
+
+import gc
+import time
+import argparse
+import tracemalloc
+import parsers
+from bench.synthetic import make_product_page
+
+VARIANTS = {
+    "fast":         parsers.extract_product,
+    "bs4 strained": parsers._product_bs4,
+    "bs4 full":     lambda html: parsers._product_bs4(html, strained=False),
+}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=50)
+    ap.add_argument("--related", type=int, default=24, help="related-product cards per page")
+    args = ap.parse_args()
+
+    pages = [make_product_page(i, args.related) for i in range(args.pages)]
+    size_kb = sum(len(p) for p in pages) / len(pages) / 1024
+    print(f"{args.pages} product pages, {size_kb:.0f} KB/page")
+
+    baseline = None
+    for name, parse in VARIANTS.items():
+        start = time.perf_counter()
+        results = [parse(p) for p in pages]
+        per_page = (time.perf_counter() - start) / len(pages) * 1000
+        gc.collect()
+        tracemalloc.start()
+        parse(pages[0])
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        if baseline is None:
+            baseline = results
+            match = "baseline"
+        else:
+            match = "same fields" if results == baseline else "FIELDS DIFFER"
+        print(f"{name:<13} {per_page:8.3f} ms/page  peak {peak:,.0f} KB  {match}")
+    print(f"fast-path fallbacks: {parsers.FAST_PATH_STATS['product_fallbacks']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# bench/servers.py
+
+import sys
+import json
+import time
+import subprocess
+import urllib.request
+
+
+def spawn(module: str, port: int, *args) -> subprocess.Popen:
+    # Run one of the bench.fake_* servers in its own process and wait for it.
+    proc = subprocess.Popen([sys.executable, "-m", module, "--port", str(port), *map(str, args)],
+                            stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/__stats", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit(f"{module} did not start on port {port}")
+
+
+def stats(port: int) -> dict:
+    return json.load(urllib.request.urlopen(f"http://127.0.0.1:{port}/__stats"))
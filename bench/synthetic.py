@@ -0,0 +1,169 @@
+# bench/synthetic.py
+
+import random
+import string
+from html import escape
+
+# ─── Synthetic amazon.ca search pages ──────────────────────────────────────────
+# Pages mimic the live markup closely enough for parser benchmarks: nav and
+# footer chrome, inline scripts, sponsored slots and result cards in several
+# layouts (with/without a strikethrough list price, with/without a price
+# fraction, the a-price-decimal span Amazon puts inside a-price-whole).
+
+WORDS = ("wireless", "charger", "usb-c", "cable", "stainless", "steel", "kitchen", "set",
+         "bluetooth", "speaker", "portable", "lego", "kids", "puzzle", "vitamin", "organic",
+         "protein", "dog", "cat", "toy", "gaming", "mouse", "keyboard", "led", "lamp", "&",
+         "pack", "of", "2", "large", "black", "women's", "men's", "shoes")
+
+PAGE_HEAD = """<!doctype html><html lang="en-ca" class="a-no-js"><head><meta charset="utf-8">
+<title>Amazon.ca : {title}</title>
+<link rel="stylesheet" href="https://m.media-amazon.com/images/I/11EIQ5IGqaL._RC|01ZTHTZObnL.css_.css">
+<script type="text/javascript">var ue_t0=ue_t0||+new Date();(function(d){{var e=d.createElement("script");e.src="https://images-na.ssl-images-amazon.com/images/G/15/x.js";d.head.appendChild(e);}})(document);</script>
+</head><body class="a-m-ca a-aui_72554-c">
+<div id="a-page"><header id="navbar-main" class="nav-opacity"><div id="nav-belt"><div class="nav-left"><a href="/ref=nav_logo" id="nav-logo-sprites" class="nav-logo-link" aria-label="Amazon.ca"><span class="nav-sprite nav-logo-base"></span></a></div>
+<div class="nav-fill"><form id="nav-search-bar-form" method="GET" action="/s/ref=nb_sb_noss"><input type="text" id="twotabsearchtextbox" value="" name="field-keywords"></form></div></div>
+<div id="nav-main" class="nav-sprite">{nav}</div></header>
+<div id="search"><span class="rush-component s-latency-cf-section"><div class="s-desktop-width-max s-desktop-content s-opposite-dir sg-row">
+<div class="sg-col-20-of-24 s-matching-dir sg-col-16-of-20 sg-col sg-col-8-of-12 sg-col-12-of-16"><div class="sg-col-inner"><span data-component-type="s-search-results" class="rush-component s-latency-cf-section"><div class="s-main-slot s-result-list s-search-results sg-row">
+"""
+
+PAGE_FOOT = """</div></span></div></div></div></span></div>
+<div id="navFooter" class="navLeftFooter nav-sprite-v1"><div class="navFooterVerticalColumn navAccessibility" role="presentation">{footer}</div></div>
+<script type="text/javascript">window.ue && ue.count && ue.count("CSMLibrarySize", 71054);</script>
+</div></body></html>
+"""
+
+AD_SLOT = """<div class="s-result-item s-widget s-widget-spacing-large AdHolder s-flex-full-width" data-component-type="sp-sponsored-result"><div class="sg-col-inner"><div class="s-widget-container"><div class="a-section"><h2 class="a-size-medium-plus">Sponsored</h2><span class="a-price"><span class="a-offscreen">$9.99</span><span aria-hidden="true"><span class="a-price-whole">9<span class="a-price-decimal">.</span></span><span class="a-price-fraction">99</span></span></span></div></div></div></div>
+"""
+
+
+def _asin(rng) -> str:
+    return "B0" + "".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(8))
+
+
+def _title(rng) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 14))).capitalize()
+
+
+def _price_spans(whole: int, frac: int, decimal_span: bool, with_fraction: bool) -> str:
+    whole_txt = f"{whole:,}"
+    decimal = '<span class="a-price-decimal">.</span>' if decimal_span else ""
+    fraction = f'<span class="a-price-fraction">{frac:02d}</span>' if with_fraction else ""
+    return (f'<span class="a-price" data-a-size="xl" data-a-color="base">'
+            f'<span class="a-offscreen">${whole_txt}.{frac:02d}</span>'
+            f'<span aria-hidden="true"><span class="a-price-symbol">$</span>'
+            f'<span class="a-price-whole">{whole_txt}{decimal}</span>{fraction}</span></span>')
+
+
+def make_card(rng, index: int, error_rate: float = 0.1) -> dict:
+    asin = _asin(rng)
+    title = _title(rng)
+    orig = rng.uniform(15, 900)
+    if rng.random() < error_rate:
+        sale = orig * rng.uniform(0.01, 0.09)
+    else:
+        sale = orig * rng.uniform(0.4, 0.95)
+    whole, frac = int(sale), int(round((sale - int(sale)) * 100)) % 100
+    has_list = rng.random() < 0.7
+    decimal_span = rng.random() < 0.5
+    with_fraction = rng.random() < 0.8
+    slug = "-".join(title.split()[:6]).replace("&", "and")
+    href = f"/{escape(slug)}/dp/{asin}/ref=sr_1_{index}?keywords=x&amp;qid=1700000000&amp;sr=8-{index}"
+
+    list_html = ""
+    if has_list:
+        list_html = (f'<div class="a-section aok-inline-block"><span class="a-size-base a-color-secondary">List: </span>'
+                     f'<span class="a-price a-text-price" data-a-size="b" data-a-strike="true" data-a-color="secondary">'
+                     f'<span class="a-offscreen">${orig:,.2f}</span><span aria-hidden="true">${orig:,.2f}</span></span></div>')
+    html = (
+        f'<div data-asin="{asin}" data-index="{index}" data-uuid="{rng.getrandbits(64):016x}" '
+        f'data-component-type="s-search-result" class="sg-col-4-of-24 sg-col-4-of-12 s-result-item s-asin sg-col-4-of-16 sg-col s-widget-spacing-small sg-col-4-of-20">'
+        f'<div class="sg-col-inner"><div cel_widget_id="MAIN-SEARCH_RESULTS-{index}" class="s-widget-container s-spacing-small s-widget-container-height-small celwidget slot=MAIN template=SEARCH_RESULTS widgetId=search-results_{index}">'
+        f'<span class="a-declarative" data-action="puis-card-container-declarative"><div class="puis-card-container s-card-container s-overflow-hidden aok-relative puis-include-content-margin puis s-latency-cf-section puis-card-border">'
+        f'<div class="a-section a-spacing-base"><div class="s-product-image-container aok-relative s-text-center s-image-overlay-grey puis-image-overlay-grey s-padding-left-small s-padding-right-small puis-spacing-small s-height-equalized puis">'
+        f'<span data-component-type="s-product-image" class="rush-component"><a class="a-link-normal s-no-outline" tabindex="-1" href="{href}">'
+        f'<div class="a-section aok-relative s-image-square-aspect"><img class="s-image" src="https://m.media-amazon.com/images/I/{asin}._AC_UL320_.jpg" '
+        f'srcset="https://m.media-amazon.com/images/I/{asin}._AC_UL320_.jpg 1x, https://m.media-amazon.com/images/I/{asin}._AC_UL480_FMwebp_QL65_.jpg 1.5x" alt="{escape(title)}" data-image-index="{index}" data-image-load=""></div></a></span></div>'
+        f'<div class="a-section a-spacing-small puis-padding-left-small puis-padding-right-small">'
+        f'<div data-cy="title-recipe" class="a-section a-spacing-none a-spacing-top-small s-title-instructions-style">'
+        f'<h2 class="a-size-mini a-spacing-none a-color-base s-line-clamp-4"><a class="a-link-normal s-underline-text s-underline-link-text s-link-style a-text-normal" href="{href}">'
+        f'<span class="a-size-base-plus a-color-base a-text-normal">{escape(title)}</span></a></h2></div>'
+        f'<div data-cy="reviews-block" class="a-section a-spacing-none a-spacing-top-micro"><div class="a-row a-size-small"><span aria-label="4.5 out of 5 stars"><i class="a-icon a-icon-star-small a-star-small-4-5 aok-align-bottom"><span class="a-icon-alt">4.5 out of 5 stars</span></i></span>'
+        f'<span aria-label="{rng.randint(1, 40000):,}"><a class="a-link-normal s-underline-text s-underline-link-text s-link-style" href="{href}#customerReviews"><span class="a-size-base s-underline-text">{rng.randint(1, 40000):,}</span></a></span></div></div>'
+        f'<div data-cy="price-recipe" class="a-section a-spacing-none a-spacing-top-small s-price-instructions-style"><div class="a-row a-size-base a-color-base">'
+        f'<a class="a-link-normal s-no-hover s-underline-text s-underline-link-text s-link-style a-text-normal" href="{href}">{_price_spans(whole, frac, decimal_span, with_fraction)}</a>'
+        f'{list_html}</div></div>'
+        f'<div data-cy="delivery-recipe" class="a-section a-spacing-none a-spacing-top-micro"><div class="a-row a-size-base a-color-secondary s-align-children-center">'
+        f'<span aria-label="FREE delivery Tue, Oct 21 on your first order"><span class="a-color-base">FREE delivery </span><span class="a-color-base a-text-bold">Tue, Oct 21</span></span></div></div>'
+        f'</div></div></div></span></div></div></div>\n'
+    )
+    return {"asin": asin, "html": html}
+
+
+def make_page(n_cards: int = 48, seed: int = 0, error_rate: float = 0.1, ad_every: int = 8) -> str:
+    rng = random.Random(seed)
+    nav = "".join(f'<a href="/b/?node={rng.randint(10**6, 10**10)}" class="nav-a">{_title(rng)}</a>'
+                  for _ in range(60))
+    footer = "".join(f'<div class="navFooterLinkCol"><ul><li><a href="/gp/help/{i}" class="nav_a">{_title(rng)}</a></li></ul></div>'
+                     for i in range(40))
+    parts = [PAGE_HEAD.format(title=escape(_title(rng)), nav=nav)]
+    for i in range(1, n_cards + 1):
+        parts.append(make_card(rng, i, error_rate)["html"])
+        if ad_every and i % ad_every == 0:
+            parts.append(AD_SLOT)
+    parts.append(PAGE_FOOT.format(footer=footer))
+    return "".join(parts)
+
+# ─── Synthetic product pages ───────────────────────────────────────────────────
+# /dp/<ASIN> pages: the same chrome, a buy box (with or without a list price,
+# sometimes out of stock with no price at all) and a carousel of related
+# products whose own a-price / a-text-price spans must not be picked up.
+
+PRODUCT_BUYBOX = """<div id="dp" class="a-container"><div id="dp-container" class="a-container" role="main">
+<div id="centerCol" class="centerColAlign"><div id="title_feature_div" class="celwidget">
+<h1 id="title" class="a-size-large a-spacing-none"><span id="productTitle" class="a-size-large product-title-word-break">        {title}       </span></h1></div>
+<div id="apex_desktop" class="celwidget"><div id="corePriceDisplay_desktop_feature_div" class="celwidget"><div class="a-section a-spacing-none aok-align-center aok-relative">{price_html}</div>{list_html}</div></div>
+<div id="availability" class="a-section a-spacing-base"><span class="a-size-medium {avail_class}">   {availability}   </span></div>
+</div></div></div>
+"""
+
+
+def _related_card(rng) -> str:
+    asin = _asin(rng)
+    price = rng.uniform(5, 500)
+    return (f'<li class="a-carousel-card"><div class="p13n-sc-uncoverable-faceout" data-asin="{asin}">'
+            f'<a class="a-link-normal" href="/dp/{asin}/ref=pd_sim"><span class="a-size-small">{escape(_title(rng))}</span></a>'
+            f'<span class="a-price" data-a-size="s"><span class="a-offscreen">${price:,.2f}</span><span aria-hidden="true">${price:,.2f}</span></span>'
+            f'<span class="a-price a-text-price" data-a-strike="true"><span class="a-offscreen">${price * 1.4:,.2f}</span></span></div></li>')
+
+
+def make_product_page(seed: int = 0, related: int = 24) -> str:
+    rng = random.Random(seed)
+    nav = "".join(f'<a href="/b/?node={rng.randint(10**6, 10**10)}" class="nav-a">{_title(rng)}</a>'
+                  for _ in range(60))
+    footer = "".join(f'<div class="navFooterLinkCol"><ul><li><a href="/gp/help/{i}" class="nav_a">{_title(rng)}</a></li></ul></div>'
+                     for i in range(40))
+    title = _title(rng)
+    in_stock = rng.random() < 0.9
+    price_html = list_html = ""
+    if in_stock:
+        list_price = rng.uniform(15, 900)
+        price = list_price * (rng.uniform(0.02, 0.09) if rng.random() < 0.2 else rng.uniform(0.5, 0.95))
+        price_html = (f'<span class="aok-offscreen">${price:,.2f}</span>'
+                      f'<span class="a-price aok-align-center reinventPricePriceToPayMargin priceToPay" data-a-size="xl" data-a-color="base">'
+                      f'<span class="a-offscreen">${price:,.2f}</span><span aria-hidden="true"><span class="a-price-symbol">$</span>'
+                      f'<span class="a-price-whole">{int(price):,}<span class="a-price-decimal">.</span></span>'
+                      f'<span class="a-price-fraction">{round(price * 100) % 100:02d}</span></span></span>')
+        if rng.random() < 0.7:
+            list_html = (f'<div class="a-section a-spacing-small aok-align-center"><span class="a-size-small a-color-secondary aok-align-center basisPrice">List Price: '
+                         f'<span class="a-price a-text-price" data-a-size="s" data-a-strike="true" data-a-color="secondary">'
+                         f'<span class="a-offscreen">${list_price:,.2f}</span><span aria-hidden="true">${list_price:,.2f}</span></span></span></div>')
+    buybox = PRODUCT_BUYBOX.format(
+        title=escape(title), price_html=price_html, list_html=list_html,
+        avail_class="a-color-success" if in_stock else "a-color-price",
+        availability="In Stock" if in_stock else "Currently unavailable.",
+    )
+    carousel = ('<div id="sims-simsContainer_feature_div" class="celwidget"><ol class="a-carousel">'
+                + "".join(_related_card(rng) for _ in range(related)) + "</ol></div>")
+    head = PAGE_HEAD.split('<div id="search">')[0].format(title=escape(title), nav=nav)
+    return head + buybox + carousel + PAGE_FOOT.format(footer=footer)
@@ -0,0 +1,104 @@
+# bench/throughput.py
+#
+# Offline parse throughput for both scrapers' parse_category, over the stored
+# corpus or synthetic pages. Each target runs in its own interpreter so the
+# peak-RSS figures don't leak into each other.
+#   python -m bench.throughput [--synthetic 96] [--pages 20] [--repeat 3] [--backend fast]
+
+import os
+import sys
+import gc
+import json
+import time
+import logging
+import argparse
+import resource
+import subprocess
+import tracemalloc
+
+TARGETS = ("bot_full", "scrape_and_notify")
+
+
+def load_target(name: str):
+    # scrape_and_notify refuses to import without a token; nothing is sent.
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench-offline")
+    if name == "bot_full":
+        import bot_full
+        parse = bot_full.parse_category
+    else:
+        import scrape_and_notify
+        parse = scrape_and_notify.parse_category
+    logging.getLogger().setLevel(logging.WARNING)
+    return parse
+
+
+def run_one(name: str, args) -> dict:
+    from bench.corpus import load_corpus, synthetic_corpus
+    import parsers
+
+    parse = load_target(name)
+    if args.synthetic:
+        pages = synthetic_corpus(args.pages, args.synthetic)
+    else:
+        pages = load_corpus(args.corpus)
+    if not pages:
+        raise SystemExit(f"no pages found in {args.corpus}")
+    html = [p for _, p in pages]
+    cards = sum(len(parsers.extract_cards(p)) for p in html)
+
+    gc.collect()
+    tracemalloc.start()
+    deals = sum(len(parse(p)) for p in html)
+    alloc_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for p in html:
+            parse(p)
+    elapsed = time.perf_counter() - start
+    n = len(html) * args.repeat
+    return {
+        "target":      name,
+        "backend":     parsers.HTML_PARSER,
+        "pages":       len(html),
+        "kb_per_page": sum(len(p) for p in html) / len(html) / 1024,
+        "deals":       deals,
+        "pages_s":     n / elapsed,
+        "items_s":     cards * args.repeat / elapsed,
+        "alloc_kb":    alloc_peak / 1024,
+        "rss_kb":      resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    from bench.corpus import FIXTURES_DIR
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", default=FIXTURES_DIR)
+    ap.add_argument("--synthetic", type=int, default=0, metavar="CARDS",
+                    help="use generated pages with this many result cards instead of the corpus")
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--backend", help="HTML_PARSER backend (default: environment)")
+    ap.add_argument("--one", choices=TARGETS, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.backend:
+        os.environ["HTML_PARSER"] = args.backend
+    if args.one:
+        print(json.dumps(run_one(args.one, args)))
+        return
+
+    print(f"{'target':<18} {'backend':<10} {'pages':>5} {'KB/page':>8} {'deals':>6} "
+          f"{'pages/s':>8} {'items/s':>9} {'alloc KB':>9} {'RSS KB':>8}")
+    for name in TARGETS:
+        out = subprocess.run([sys.executable, "-m", "bench.throughput", *sys.argv[1:], "--one", name],
+                             capture_output=True, text=True, check=True)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{r['target']:<18} {r['backend']:<10} {r['pages']:>5} {r['kb_per_page']:>8.0f} {r['deals']:>6} "
+              f"{r['pages_s']:>8.1f} {r['items_s']:>9.0f} {r['alloc_kb']:>9,.0f} {r['rss_kb']:>8,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bloom.py
+
+import os
+import struct
+import hashlib
+
+# ─── Bloom filter ──────────────────────────────────────────────────────────────
+# A bit array plus k double-hashed probes per item. "Not in the filter" is
+# definite; "in the filter" only means the authoritative store has to be
+# asked. The caller reports the times the store then had nothing
+# (false_positive), which gives the observed false-positive rate.
+HEADER = struct.Struct(">4sIQQ")   # magic, hashes, bits, generation
+MAGIC  = b"BLM1"
+
+
+class BloomFilter:
+    def __init__(self, bits: int, hashes: int = 7, generation: int = 0):
+        self.bits = bits
+        self.hashes = hashes
+        self.generation = generation
+        self.array = bytearray((bits + 7) // 8)
+        self.stats = {"lookups": 0, "definitely_new": 0, "maybe_seen": 0, "false_positives": 0}
+
+    def _probes(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item: bytes) -> None:
+        for bit in self._probes(item):
+            self.array[bit >> 3] |= 1 << (bit & 7)
+
+    def __contains__(self, item: bytes) -> bool:
+        found = all(self.array[bit >> 3] & (1 << (bit & 7)) for bit in self._probes(item))
+        self.stats["lookups"] += 1
+        self.stats["maybe_seen" if found else "definitely_new"] += 1
+        return found
+
+    def false_positive(self) -> None:
+        self.stats["false_positives"] += 1
+
+    def false_positive_rate(self) -> float:
+        # Share of absent items the filter let through to the store.
+        absent = self.stats["definitely_new"] + self.stats["false_positives"]
+        return self.stats["false_positives"] / absent if absent else 0.0
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.hashes, self.bits, self.generation))
+            f.write(self.array)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        # None when the file is missing or isn't a filter we wrote.
+        try:
+            with open(path, "rb") as f:
+                magic, hashes, bits, generation = HEADER.unpack(f.read(HEADER.size))
+                array = f.read()
+        except (FileNotFoundError, struct.error):
+            return None
+        if magic != MAGIC or len(array) != (bits + 7) // 8:
+            return None
+        bloom = cls(bits, hashes, generation)
+        bloom.array[:] = array
+        return bloom
@@ -1,10 +1,16 @@
 import os
-import json
 import logging
-import requests
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ForceReply
+# The local modules below read their settings from the environment on import.
+load_dotenv()
+from fetch import AMAZON_BASE_URL, fetch, fetch_all, log_fetch
+from parsers import extract_cards, extract_product
+from storage import alert_asin, open_state, open_seen_store
+from seen_store import price_bucket
+from threshold_index import ThresholdIndex
+from send_queue import SendQueue
+from digest import pack
+from telegram import Chat, Update, InlineKeyboardButton, InlineKeyboardMarkup, ForceReply, ReplyParameters
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -17,38 +23,48 @@ from telegram.ext import (
 )
 
 # ─── Load .env ─────────────────────────────────────────────────────────────────
-load_dotenv()
 BOT_TOKEN      = os.getenv("TELEGRAM_BOT_TOKEN")
 AFFILIATE_TAG  = os.getenv("AMZN_AFFILIATE_TAG", "amznerrorsca-20")
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 DEBUG_PING     = os.getenv("DEBUG_PING", "false").lower() == "true"
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
 
 # ─── File paths ─────────────────────────────────────────────────────────────────
 DATA_DIR       = os.getenv("DATA_DIR", ".")
-SEEN_FILE      = os.path.join(DATA_DIR, "seen.json")
-SUBS_FILE      = os.path.join(DATA_DIR, "subscriptions.json")
-ALERTS_FILE    = os.path.join(DATA_DIR, "alerts.json")
 
 # ─── Logging ───────────────────────────────────────────────────────────────────
 logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ─── State ─────────────────────────────────────────────────────────────────────
+# subscriptions.json/alerts.json by default, or DATA_DIR/state.db with
+# STATE_BACKEND=sqlite (imported from the JSON files on first start).
+state = open_state(DATA_DIR)
+# Subscribers per category sorted by min_discount, for the subscription job.
+subs_index = ThresholdIndex.from_subscriptions(state.all_subscriptions())
+# Every outgoing message goes through one rate-limited queue (bot set in main).
+sender = SendQueue()
+
 # ─── Helpers ───────────────────────────────────────────────────────────────────
-def load_json(path: str) -> dict:
-    try:
-        with open(path, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+def get_target(update: Update):
+    return update.message or (update.callback_query and update.callback_query.message)
 
 
-def save_json(path: str, data: dict) -> None:
-    with open(path, 'w') as f:
-        json.dump(data, f, indent=2)
+def reply(msg, text: str, **kwargs):
+    # msg.reply_text() through the send queue; quotes in groups like it does.
+    if msg.chat.type != Chat.PRIVATE:
+        kwargs.setdefault("reply_parameters", ReplyParameters(msg.message_id))
+    return sender.put(msg.chat_id, text, **kwargs)
 
 
-def get_target(update: Update):
-    return update.message or (update.callback_query and update.callback_query.message)
+def deal_messages(lines: list, header: str, digest: bool) -> list:
+    # One message per deal, or as few packed digests as fit when the chat
+    # has turned on /digest.
+    return pack(lines, header) if digest else lines
+
+
+def deal_line(d: dict, icon: str = "📢") -> str:
+    return f"{icon} {d['title']} — ${d['sale']} ({d['discount']}% off)\n{d['link']}"
 
 # ─── Category mapping ──────────────────────────────────────────────────────────
 CATEGORY_MAP = {
@@ -60,7 +76,7 @@ HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Language": "en-CA"}
 
 def make_url(path: str) -> str:
     suffix = '?sort=price-asc-rank' if '?' not in path else '&sort=price-asc-rank'
-    return f"https://www.amazon.ca{path}{suffix}"
+    return f"{AMAZON_BASE_URL}{path}{suffix}"
 
 
 def get_category_urls(cat: str = None) -> list:
@@ -71,29 +87,22 @@ def get_category_urls(cat: str = None) -> list:
 
 # ─── Scraping functions ────────────────────────────────────────────────────────
 
-def scrape_category(url: str, min_discount: int = 0) -> list:
-    resp = requests.get(url, headers=HEADERS, timeout=10)
-    soup = BeautifulSoup(resp.text, "html.parser")
-    items = soup.select('div[data-component-type="s-search-result"]')
+def parse_category(html: str, min_discount: int = 0) -> list:
     deals = []
-    for it in items:
-        title_el = it.select_one("h2 a span")
-        sale_whole = it.select_one("span.a-price-whole")
-        orig_el = it.select_one("span.a-price.a-text-price span.a-offscreen")
-        if not (title_el and sale_whole and orig_el):
+    for card in extract_cards(html):
+        if None in (card["title"], card["price_whole"], card["list_price"], card["href"]):
             continue
         try:
-            sale = float(sale_whole.text.replace(',', '') + ".00")
-            orig = float(orig_el.text.strip().lstrip('$').replace(',', ''))
+            sale = float(card["price_whole"].replace(',', '') + ".00")
+            orig = float(card["list_price"].strip().lstrip('$').replace(',', ''))
         except ValueError:
             continue
         discount = int((orig - sale) / orig * 100)
         if discount < min_discount:
             continue
-        href = it.select_one("h2 a[href]")["href"]
-        asin = href.split("/dp/")[-1].split("/")[0]
+        asin = card["href"].split("/dp/")[-1].split("/")[0]
         deals.append({
-            "title": title_el.text.strip(),
+            "title": card["title"].strip(),
             "sale": f"{sale:.2f}",
             "orig": f"{orig:.2f}",
             "discount": discount,
@@ -103,10 +112,37 @@ def scrape_category(url: str, min_discount: int = 0) -> list:
     return deals
 
 
+def scrape_category(url: str, min_discount: int = 0) -> list:
+    result = fetch(url, HEADERS)
+    log_fetch(result)
+    return parse_category(result.text, min_discount)
+
+
+def parse_product(html: str, asin: str):
+    # A /dp/ page as a deal dict; None when it shows no title or price
+    # (e.g. out of stock). Without a list price the discount is 0.
+    p = extract_product(html)
+    if p["title"] is None or p["price"] is None:
+        return None
+    try:
+        sale = float(p["price"].strip().lstrip('$').replace(',', ''))
+        orig = float(p["list_price"].strip().lstrip('$').replace(',', '')) if p["list_price"] else sale
+    except ValueError:
+        return None
+    return {
+        "title": p["title"].strip(),
+        "sale": f"{sale:.2f}",
+        "orig": f"{orig:.2f}",
+        "discount": int((orig - sale) / orig * 100) if orig else 0,
+        "link": f"https://www.amazon.ca/dp/{asin}?tag={AFFILIATE_TAG}",
+        "asin": asin,
+        "availability": (p["availability"] or "").strip()
+    }
+
+
 def scrape_deals(cat: str = None, min_discount: int = 0) -> list:
     results = []
     for url in get_category_urls(cat):
-        logger.info(f"Scraping {url}")
         results.extend(scrape_category(url, min_discount))
     return results
 
@@ -123,7 +159,7 @@ async def menu_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("Help", callback_data="cmd:help")]
     ]
     markup = InlineKeyboardMarkup(kb)
-    await tgt.reply_text("Please choose an action:", reply_markup=markup)
+    reply(tgt, "Please choose an action:", reply_markup=markup)
     if update.callback_query:
         await update.callback_query.answer()
 
@@ -131,144 +167,203 @@ async def menu_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 async def search_start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     tgt = get_target(update)
-    await tgt.reply_text("🔍 Reply with: <category> <min_discount>", reply_markup=ForceReply(selective=True))
+    reply(tgt, "🔍 Reply with: <category> <min_discount>", reply_markup=ForceReply(selective=True))
     return SEARCH
 
 async def search_input(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     parts = update.message.text.strip().split()
     if len(parts) != 2 or not parts[1].isdigit():
-        await update.message.reply_text("Invalid format. Use: <category> <min_discount>")
+        reply(update.message, "Invalid format. Use: <category> <min_discount>")
         return SEARCH
     cat, min_d = parts[0], int(parts[1])
     deals = scrape_deals(cat, min_d)
     if not deals:
-        await update.message.reply_text("No deals found.")
+        reply(update.message, "No deals found.")
+    elif str(update.message.chat.id) in state.digest_chats():
+        # As many results as fit in one message instead of the first five.
+        reply(update.message, pack([deal_line(d) for d in deals], f"🔍 {cat} @ {min_d}%+")[0])
     else:
         for d in deals[:5]:
-            await update.message.reply_text(f"📢 {d['title']} — ${d['sale']} ({d['discount']}% off)\n{d['link']}")
+            reply(update.message, deal_line(d))
     return ConversationHandler.END
 
 async def subscribe_start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     tgt = get_target(update)
-    await tgt.reply_text("🔔 Reply with: <category> <min_discount> to subscribe", reply_markup=ForceReply(selective=True))
+    reply(tgt, "🔔 Reply with: <category> <min_discount> to subscribe", reply_markup=ForceReply(selective=True))
     return SUBSCRIBE
 
 async def subscribe_input(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     parts = update.message.text.strip().split()
     if len(parts) != 2 or not parts[1].isdigit():
-        await update.message.reply_text("Invalid format. Use: <category> <min_discount>")
+        reply(update.message, "Invalid format. Use: <category> <min_discount>")
         return SUBSCRIBE
     cat, min_d = parts[0].lower(), int(parts[1])
-    data = load_json(SUBS_FILE)
-    uid = str(update.message.chat.id)
-    data.setdefault(uid, {})[cat] = min_d
-    save_json(SUBS_FILE, data)
-    await update.message.reply_text(f"Subscribed: {cat} @ {min_d}%")
+    state.subscribe(str(update.message.chat.id), cat, min_d)
+    subs_index.subscribe(str(update.message.chat.id), cat, min_d)
+    reply(update.message, f"Subscribed: {cat} @ {min_d}%")
     return ConversationHandler.END
 
 async def unsubscribe_start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     tgt = get_target(update)
-    await tgt.reply_text("❌ Reply with category to unsubscribe", reply_markup=ForceReply(selective=True))
+    reply(tgt, "❌ Reply with category to unsubscribe", reply_markup=ForceReply(selective=True))
     return UNSUBSCRIBE
 
 async def unsubscribe_input(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     cat = update.message.text.strip().lower()
-    data = load_json(SUBS_FILE)
-    uid = str(update.message.chat.id)
-    if uid in data and cat in data[uid]:
-        del data[uid][cat]
-        save_json(SUBS_FILE, data)
-        await update.message.reply_text(f"Unsubscribed: {cat}")
+    subs_index.unsubscribe(str(update.message.chat.id), cat)
+    if state.unsubscribe(str(update.message.chat.id), cat):
+        reply(update.message, f"Unsubscribed: {cat}")
     else:
-        await update.message.reply_text(f"No subscription found: {cat}")
+        reply(update.message, f"No subscription found: {cat}")
     return ConversationHandler.END
 
 async def alert_start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     tgt = get_target(update)
-    await tgt.reply_text("⚠️ Reply with: <URL_or_ASIN> <min_drop>", reply_markup=ForceReply(selective=True))
+    reply(tgt, "⚠️ Reply with: <URL_or_ASIN> <min_drop>", reply_markup=ForceReply(selective=True))
     return ALERT
 
 async def alert_input(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     parts = update.message.text.strip().split()
     if len(parts) != 2 or not parts[1].isdigit():
-        await update.message.reply_text("Invalid format. Use: <URL_or_ASIN> <min_drop>")
+        reply(update.message, "Invalid format. Use: <URL_or_ASIN> <min_drop>")
         return ALERT
     item, min_d = parts[0], int(parts[1])
-    data = load_json(ALERTS_FILE)
-    uid = str(update.message.chat.id)
-    data.setdefault(uid, {})[item] = min_d
-    save_json(ALERTS_FILE, data)
-    await update.message.reply_text(f"Alert set on {item} @ {min_d}% drop")
+    state.set_alert(str(update.message.chat.id), item, min_d)
+    reply(update.message, f"Alert set on {item} @ {min_d}% drop")
     return ConversationHandler.END
 
 # ─── Static callbacks ─────────────────────────────────────────────────────────
 async def help_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     tgt = get_target(update)
-    await tgt.reply_text(
+    reply(tgt,
         "/menu — show options\n"
         "/help — this message\n"
         "/mysettings — list subscriptions\n"
+        "/digest on|off — bundle deals into one message per run\n"
         "/scrape — manual scrape (admin only)"
     )
 
 async def mysettings_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     tgt = get_target(update)
     uid = str(tgt.chat.id)
-    subs = load_json(SUBS_FILE).get(uid, {})
+    subs = state.subscriptions_for(uid)
+    digest = "on" if uid in state.digest_chats() else "off"
     if not subs:
-        return await tgt.reply_text("No subscriptions.")
+        reply(tgt, f"No subscriptions.\nDigest: {digest}")
+        return
     lines = [f"{c}: {d}%" for c, d in subs.items()]
-    await tgt.reply_text("Your subscriptions:\n" + "\n".join(lines))
+    reply(tgt, "Your subscriptions:\n" + "\n".join(lines) + f"\nDigest: {digest}")
+
+async def digest_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    tgt = get_target(update)
+    uid = str(tgt.chat.id)
+    arg = ctx.args[0].lower() if ctx.args else ""
+    if arg not in ("on", "off"):
+        current = "on" if uid in state.digest_chats() else "off"
+        reply(tgt, f"Digest is {current}. Use /digest on or /digest off.")
+        return
+    state.set_digest(uid, arg == "on")
+    if arg == "on":
+        reply(tgt, "📦 Digest on: each run's deals arrive bundled in as few messages as possible.")
+    else:
+        reply(tgt, "Digest off: one message per deal.")
 
 async def scrape_manual(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     tgt = get_target(update)
     user = tgt.from_user.username
     if ADMIN_USERNAME and user != ADMIN_USERNAME:
-        return await tgt.reply_text("❌ Not authorized.")
-    await tgt.reply_text("🔄 Scraping now...")
+        reply(tgt, "❌ Not authorized.")
+        return
+    reply(tgt, "🔄 Scraping now...")
     deals = scrape_deals()
-    seen = load_json(SEEN_FILE).get("links", [])
-    count = 0
-    for d in deals:
-        if d['link'] not in seen:
-            count += 1
-            await tgt.reply_text(f"📢 {d['title']} — ${d['sale']} ({d['discount']}% off)\n{d['link']}")
-            seen.append(d['link'])
-    save_json(SEEN_FILE, {"links": seen})
-    await tgt.reply_text(f"✅ Done: {count} new deals.")
+    with open_seen_store(DATA_DIR) as seen:
+        lines = [deal_line(d) for d in deals if seen.add_deal(d['asin'], float(d['sale']))]
+    for text in deal_messages(lines, "📢 New deals", str(tgt.chat.id) in state.digest_chats()):
+        reply(tgt, text)
+    reply(tgt, f"✅ Done: {len(lines)} new deals.")
 
 # ─── Background jobs ──────────────────────────────────────────────────────────
 async def job_subscriptions(context: ContextTypes.DEFAULT_TYPE):
-    data = load_json(SUBS_FILE)
-    for uid, cats in data.items():
-        for cat, min_d in cats.items():
-            deals = scrape_deals(cat, min_d)
-            for d in deals:
-                await context.bot.send_message(
-                    chat_id=int(uid), text=f"🔔 {d['title']} — ${d['sale']} ({d['discount']}% off)\n{d['link']}"
-                )
+    # Each subscribed category is scraped once per cycle, whatever its
+    # number of subscribers, with every page fetched concurrently; the
+    # index then gives the users whose min_discount each deal meets.
+    urls = {cat: get_category_urls(cat) for cat in subs_index.categories()}
+    distinct = list(dict.fromkeys(u for cat_urls in urls.values() for u in cat_urls))
+    pages = {}
+    for url, result in zip(distinct, await fetch_all(distinct, HEADERS)):
+        log_fetch(result)
+        pages[url] = parse_category(result.text) if result.ok else []
+    pending = {}
+    for cat, cat_urls in urls.items():
+        deals = [d for url in cat_urls for d in pages[url]]
+        logger.info(f"Subscriptions: {cat} → {len(deals)} deal(s) for {subs_index.subscribers(cat)} subscriber(s)")
+        for d in deals:
+            for uid in subs_index.matching(cat, d['discount']):
+                pending.setdefault(uid, []).append(deal_line(d, "🔔"))
+    digest = state.digest_chats()
+    for uid, lines in pending.items():
+        for text in deal_messages(lines, "🔔 New deals for your subscriptions", uid in digest):
+            sender.put(int(uid), text)
 
 async def job_alerts(context: ContextTypes.DEFAULT_TYPE):
-    data = load_json(ALERTS_FILE)
+    # Every alert is reduced to its ASIN and each distinct ASIN is fetched
+    # once per cycle, concurrently; all its watchers are then checked
+    # against that one result. A watcher is alerted once, then again only
+    # when the price falls into a lower bucket (as for posted deals); once
+    # the alert's drop no longer holds, the next one that does is new.
+    data = state.all_alerts()
+    watchers = {}
     for uid, items in data.items():
         for item, min_d in items.items():
-            if len(item) == 10:
-                deals = scrape_category(f"https://www.amazon.ca/dp/{item}?tag={AFFILIATE_TAG}")
-                if deals:
-                    d = deals[0]
-                    await context.bot.send_message(chat_id=int(uid), text=f"🔔 {d['title']} now at ${d['sale']}\n{d['link']}"
-                    )
+            asin = alert_asin(item)
+            if asin is None:
+                logger.warning(f"Alert {item!r} for {uid} has no ASIN, skipped")
+                continue
+            watchers.setdefault(asin, []).append((uid, min_d))
+    logger.info(f"Alerts: {sum(map(len, watchers.values()))} alert(s) on {len(watchers)} ASIN(s)")
+
+    results = await fetch_all([f"{AMAZON_BASE_URL}/dp/{asin}" for asin in watchers], HEADERS)
+    notices = state.alert_notices()
+    pending, changes = {}, {}
+    for asin, result in zip(watchers, results):
+        log_fetch(result)
+        d = parse_product(result.text, asin) if result.ok else None
+        if d is None:
+            continue
+        bucket = price_bucket(float(d['sale']))
+        for uid, min_d in watchers[asin]:
+            last = changes.get((uid, asin), notices.get(uid, {}).get(asin))
+            if d['discount'] < min_d:
+                if last is not None:
+                    changes[(uid, asin)] = None
+                continue
+            if last is not None and bucket >= last:
+                continue
+            changes[(uid, asin)] = bucket
+            pending.setdefault(uid, []).append(f"🔔 {d['title']} now at ${d['sale']}\n{d['link']}")
+    if changes:
+        state.set_alert_notices(changes)
+    digest = state.digest_chats()
+    for uid, lines in pending.items():
+        for text in deal_messages(lines, "🔔 Price alerts", uid in digest):
+            sender.put(int(uid), text)
     if DEBUG_PING and data:
         first = next(iter(data))
-        await context.bot.send_message(chat_id=int(first), text="✅ Alert job ran.")
+        sender.put(int(first), "✅ Alert job ran.")
+
+async def job_compact_seen(context: ContextTypes.DEFAULT_TYPE):
+    # Loading already drops expired entries; compact() persists that.
+    with open_seen_store(DATA_DIR) as seen:
+        seen.compact()
 
 # ─── Bot setup ─────────────────────────────────────────────────────────────────
 
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = ApplicationBuilder().token(BOT_TOKEN).base_url(f"{TELEGRAM_API_URL}/bot").build()
+    sender.bot = app.bot
     jq: JobQueue = app.job_queue
 
     # Start/menu
@@ -279,6 +374,7 @@ def main():
     app.add_handler(CommandHandler("help", help_cmd))
     app.add_handler(CommandHandler("mysettings", mysettings_cmd))
     app.add_handler(CommandHandler("scrape", scrape_manual))
+    app.add_handler(CommandHandler("digest", digest_cmd))
 
     # Inline menu flows
     app.add_handler(ConversationHandler(
@@ -310,6 +406,7 @@ def main():
     # Scheduled jobs
     jq.run_repeating(job_subscriptions, interval=3600, first=10)
     jq.run_repeating(job_alerts, interval=3600, first=20)
+    jq.run_repeating(job_compact_seen, interval=86400, first=300)
 
     app.run_polling()
 
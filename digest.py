@@ -0,0 +1,46 @@
+# digest.py
+
+# ─── Digest packing ────────────────────────────────────────────────────────────
+# Packs rendered deal entries into as few messages as Telegram allows: each
+# message is the header followed by whole entries, up to the 4096-character
+# limit. Telegram counts UTF-16 code units, so emoji count double here, and
+# markup characters are counted too although Telegram strips them; both
+# only err on the short side. An entry is never split across messages,
+# which keeps its Markdown balanced.
+TELEGRAM_MAX_CHARS = 4096
+
+
+def tg_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _truncate(text: str, limit: int) -> str:
+    # At most `limit` units, ellipsis included.
+    text = text[:limit - 1]
+    while tg_len(text) > limit - 1:
+        text = text[:-1]
+    return text + "…"
+
+
+def batches(entries: list, header: str = "", limit: int = TELEGRAM_MAX_CHARS, sep: str = "\n\n") -> list:
+    # The entries grouped per message, in order (over-long ones truncated).
+    groups, current = [], None
+    room = limit - tg_len(header) - tg_len(sep) if header else limit
+    for entry in entries:
+        if tg_len(entry) > room:
+            entry = _truncate(entry, room)
+        if current is not None and tg_len(current) + tg_len(sep) + tg_len(entry) <= limit:
+            current += sep + entry
+            groups[-1].append(entry)
+        else:
+            current = f"{header}{sep}{entry}" if header else entry
+            groups.append([entry])
+    return groups
+
+
+def render(group: list, header: str = "", sep: str = "\n\n") -> str:
+    return sep.join([header, *group] if header else group)
+
+
+def pack(entries: list, header: str = "", limit: int = TELEGRAM_MAX_CHARS, sep: str = "\n\n") -> list:
+    return [render(group, header, sep) for group in batches(entries, header, limit, sep)]
@@ -0,0 +1,89 @@
+# fetch.py
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+import httpx
+import requests
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+FETCH_TIMEOUT     = 10
+# Where pages are fetched from; deal links always point at amazon.ca.
+AMAZON_BASE_URL   = os.getenv("AMAZON_BASE_URL", "https://www.amazon.ca").rstrip("/")
+
+# ─── Response object ───────────────────────────────────────────────────────────
+@dataclass
+class FetchResult:
+    url:      str
+    status:   int | None
+    headers:  dict = field(default_factory=dict)
+    body:     bytes = b""
+    elapsed:  float = 0.0
+    encoding: str = "utf-8"
+    error:    str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and 200 <= self.status < 400
+
+    @property
+    def text(self) -> str:
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+
+def log_fetch(result: FetchResult) -> None:
+    if result.error:
+        logger.warning(f"GET {result.url} failed after {result.elapsed:.2f}s: {result.error}")
+    else:
+        logger.info(f"GET {result.url} → {result.status} "
+                    f"({len(result.body)} bytes, {result.elapsed:.2f}s)")
+
+# ─── Blocking fetch ────────────────────────────────────────────────────────────
+_session = requests.Session()
+
+def fetch(url: str, headers: dict) -> FetchResult:
+    start = time.perf_counter()
+    try:
+        resp = _session.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+    except requests.RequestException as e:
+        return FetchResult(url, None, elapsed=time.perf_counter() - start, error=str(e))
+    return FetchResult(url, resp.status_code, dict(resp.headers), resp.content,
+                       time.perf_counter() - start, resp.encoding or "utf-8")
+
+# ─── Concurrent crawler ────────────────────────────────────────────────────────
+def open_client(headers: dict, concurrency: int = CRAWL_CONCURRENCY) -> httpx.AsyncClient:
+    # One keep-alive pool for a whole crawl.
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(headers=headers, timeout=FETCH_TIMEOUT, limits=limits, follow_redirects=True)
+
+
+async def get(client: httpx.AsyncClient, url: str) -> FetchResult:
+    start = time.perf_counter()
+    try:
+        resp = await client.get(url)
+    except httpx.HTTPError as e:
+        return FetchResult(url, None, elapsed=time.perf_counter() - start, error=str(e) or type(e).__name__)
+    return FetchResult(url, resp.status_code, dict(resp.headers), resp.content,
+                       time.perf_counter() - start, resp.encoding or "utf-8")
+
+
+async def fetch_all(urls: list, headers: dict, concurrency: int = CRAWL_CONCURRENCY,
+                    client: httpx.AsyncClient = None) -> list:
+    # The semaphore keeps waiting requests out of the pool so they don't
+    # trip its acquire timeout. Pass a client from open_client() to share
+    # one pool across calls; otherwise one is opened for this call.
+    if client is None:
+        async with open_client(headers, concurrency) as client:
+            return await fetch_all(urls, headers, concurrency, client)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(url):
+        async with sem:
+            return await get(client, url)
+
+    return await asyncio.gather(*(fetch_one(u) for u in urls))
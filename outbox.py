@@ -0,0 +1,118 @@
+# outbox.py
+
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+# Failed sends before a post is given up on; errors Telegram will never
+# accept (bad markup, a chat the bot can't post to) give up at once.
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+# ─── Outbox ────────────────────────────────────────────────────────────────────
+# Posts are written here, durably, before the seen store is saved (a failed
+# run doesn't save it at all). They are only marked delivered once Telegram
+# has accepted them. A crash or failed send leaves them pending and the next
+# run posts them first. Every entry
+# carries an idempotency key, and enqueueing a key the outbox already holds
+# (pending or delivered) is a no-op, so a run that re-scrapes a deal after a
+# crash doesn't post it twice. The file is an append-only JSON-lines log of
+# "enqueue", "sent" and "failed" records. A post that keeps failing is
+# dead-lettered: no longer pending, and logged and dropped by compact(),
+# which also drops delivered entries once the seen store has been saved to
+# cover them.
+class Outbox:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}      # key → {"chat_id", "text", "enqueued", "sent", "attempts", "dead"}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue      # torn last line from a crash mid-append
+            if rec["op"] == "enqueue":
+                self.entries.setdefault(rec["key"], {"chat_id": rec["chat_id"], "text": rec["text"],
+                                                     "enqueued": rec["ts"], "sent": None,
+                                                     "attempts": rec.get("attempts", 0), "dead": None})
+            elif rec["op"] == "sent" and rec["key"] in self.entries:
+                self.entries[rec["key"]]["sent"] = rec["ts"]
+            elif rec["op"] == "failed" and rec["key"] in self.entries:
+                self._failed(self.entries[rec["key"]], rec["error"], rec["permanent"])
+        backlog = len(self.pending())
+        if backlog:
+            logger.info(f"Outbox: {backlog} post(s) pending from an earlier run")
+
+    def _append(self, records: list) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def enqueue(self, key: str, chat_id, text: str) -> bool:
+        # True when the entry was added, False when the key was already known.
+        if key in self.entries:
+            return False
+        now = time.time()
+        self._append([{"op": "enqueue", "key": key, "chat_id": chat_id, "text": text, "ts": now}])
+        self.entries[key] = {"chat_id": chat_id, "text": text, "enqueued": now, "sent": None,
+                             "attempts": 0, "dead": None}
+        return True
+
+    def pending(self) -> list:
+        # (key, chat_id, text) in enqueue order.
+        return [(k, e["chat_id"], e["text"]) for k, e in self.entries.items()
+                if e["sent"] is None and e["dead"] is None]
+
+    def mark_sent(self, keys: list) -> None:
+        now = time.time()
+        self._append([{"op": "sent", "key": k, "ts": now} for k in keys])
+        for k in keys:
+            self.entries[k]["sent"] = now
+
+    @staticmethod
+    def _failed(entry: dict, error: str, permanent: bool) -> None:
+        entry["attempts"] += 1
+        if permanent or entry["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            entry["dead"] = error
+
+    def mark_failed(self, keys: list, error: str, permanent: bool = False) -> None:
+        now = time.time()
+        self._append([{"op": "failed", "key": k, "ts": now, "error": error, "permanent": permanent}
+                      for k in keys])
+        for k in keys:
+            self._failed(self.entries[k], error, permanent)
+
+    def compact(self) -> None:
+        delivered = [k for k, e in self.entries.items() if e["sent"] is not None]
+        dead = [k for k, e in self.entries.items() if e["sent"] is None and e["dead"] is not None]
+        if not delivered and not dead:
+            return
+        for k in dead:
+            e = self.entries[k]
+            logger.warning(f"Outbox: dropping post {k} to {e['chat_id']} after {e['attempts']} "
+                           f"failed attempt(s): {e['dead']}")
+        for k in delivered + dead:
+            del self.entries[k]
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for k, e in self.entries.items():
+                rec = {"op": "enqueue", "key": k, "chat_id": e["chat_id"], "text": e["text"], "ts": e["enqueued"],
+                       "attempts": e["attempts"]}
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        logger.info(f"Compacted outbox: {len(delivered)} delivered, {len(dead)} dead-lettered, "
+                    f"{len(self.entries)} pending")
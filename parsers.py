@@ -0,0 +1,290 @@
+# parsers.py
+
+import os
+import re
+import logging
+from html import unescape
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+HTML_PARSER        = os.getenv("HTML_PARSER", "fast").lower()
+PARSE_RESULTS_ONLY = os.getenv("PARSE_RESULTS_ONLY", "true").lower() == "true"
+
+RESULT_SELECTOR = 'div[data-component-type="s-search-result"]'
+TITLE_SELECTOR  = "h2 a span"
+WHOLE_SELECTOR  = "span.a-price-whole"
+FRAC_SELECTOR   = "span.a-price-fraction"
+LIST_SELECTOR   = "span.a-price.a-text-price span.a-offscreen"
+HREF_SELECTOR   = "h2 a[href]"
+
+# Every backend returns the same raw "card" per search result: the text of
+# each matched element (None when it's missing) and the product href. The
+# scrapers turn cards into deals, so prices and discounts are computed the
+# same way whichever backend did the parsing.
+def make_card(title, whole, frac, list_price, href) -> dict:
+    return {
+        "title":          title,
+        "price_whole":    whole,
+        "price_fraction": frac,
+        "list_price":     list_price,
+        "href":           href,
+    }
+
+# ─── BeautifulSoup (html.parser) ───────────────────────────────────────────────
+def _cards_bs4(html: str, results_only: bool = None) -> list:
+    from bs4 import BeautifulSoup, SoupStrainer
+    if results_only is None:
+        results_only = PARSE_RESULTS_ONLY
+    # Nav, footer, scripts and ad slots never reach the tree when strained;
+    # only the result containers (and everything inside them) are built.
+    only = SoupStrainer("div", attrs={"data-component-type": "s-search-result"}) if results_only else None
+    soup = BeautifulSoup(html, "html.parser", parse_only=only)
+    return [_card_bs4(it) for it in soup.select(RESULT_SELECTOR)]
+
+def _card_bs4(it) -> dict:
+    def text(sel):
+        el = it.select_one(sel)
+        return el.text if el is not None else None
+    href_el = it.select_one(HREF_SELECTOR)
+    return make_card(text(TITLE_SELECTOR), text(WHOLE_SELECTOR), text(FRAC_SELECTOR),
+                     text(LIST_SELECTOR), href_el["href"] if href_el is not None else None)
+
+# ─── lxml ──────────────────────────────────────────────────────────────────────
+def _has_class(name: str) -> str:
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+_XP_RESULTS = '//div[@data-component-type="s-search-result"]'
+_XP_TITLE   = ".//h2//a//span"
+_XP_WHOLE   = f".//span[{_has_class('a-price-whole')}]"
+_XP_FRAC    = f".//span[{_has_class('a-price-fraction')}]"
+_XP_LIST    = (f".//span[{_has_class('a-price')} and {_has_class('a-text-price')}]"
+               f"//span[{_has_class('a-offscreen')}]")
+_XP_HREF    = ".//h2//a[@href]"
+
+def _cards_lxml(html: str) -> list:
+    try:
+        import lxml.html
+    except ImportError:
+        raise RuntimeError("HTML_PARSER=lxml requires the lxml package")
+    if not html.strip():
+        return []
+    root = lxml.html.fromstring(html)
+    cards = []
+    for it in root.xpath(_XP_RESULTS):
+        def text(xp):
+            found = it.xpath(xp)
+            return found[0].text_content() if found else None
+        href_el = it.xpath(_XP_HREF)
+        cards.append(make_card(text(_XP_TITLE), text(_XP_WHOLE), text(_XP_FRAC),
+                               text(_XP_LIST), href_el[0].get("href") if href_el else None))
+    return cards
+
+# ─── selectolax (lexbor) ───────────────────────────────────────────────────────
+def _cards_selectolax(html: str) -> list:
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError:
+        raise RuntimeError("HTML_PARSER=selectolax requires the selectolax package")
+    tree = LexborHTMLParser(html)
+    cards = []
+    for it in tree.css(RESULT_SELECTOR):
+        def text(sel):
+            el = it.css_first(sel)
+            return el.text() if el is not None else None
+        href_el = it.css_first(HREF_SELECTOR)
+        cards.append(make_card(text(TITLE_SELECTOR), text(WHOLE_SELECTOR), text(FRAC_SELECTOR),
+                               text(LIST_SELECTOR),
+                               href_el.attributes.get("href") if href_el is not None else None))
+    return cards
+
+# ─── Regex fast path ───────────────────────────────────────────────────────────
+# Pulls the card fields straight out of the page text for the common layout.
+# A field is only taken from the text when the first occurrence of its class
+# name in the card is the exact markup we expect, which guarantees it's the
+# element select_one would have returned; anything else sends that card to
+# the bs4 path. Pages whose card boundaries can't be trusted (raw-text
+# elements, comments, stray angle brackets, nested cards) go to bs4 whole.
+_RE_CARD_START = re.compile(r'<div\b[^>]*\bdata-component-type="s-search-result"[^>]*>')
+_RE_CARD_ANY   = re.compile(r's-search-result(?![\w-])')
+_RE_DIV_TAG    = re.compile(r'<(/?)div\b[^>]*?(/?)>', re.I)
+_RE_RAW_TEXT   = re.compile(r'<(?:script|style|textarea|template|title|xmp|iframe|noembed|noframes|noscript|plaintext)\b|<!', re.I)
+_RE_H2         = re.compile(r'<h2\b', re.I)
+_RE_TITLE      = re.compile(r'<h2\b[^>]*>\s*<a\b([^>]*)>\s*<span\b[^>]*>([^<]*)</span>')
+_RE_HREF_ATTR  = re.compile(r'\shref="([^"]*)"')
+_RE_WHOLE      = re.compile(r'<span class="a-price-whole">([^<]*)(?:<span class="a-price-decimal">([^<]*)</span>)?</span>')
+_RE_FRAC       = re.compile(r'<span class="a-price-fraction">([^<]*)</span>')
+_RE_LIST       = re.compile(r'<span class="a-price a-text-price"[^>]*>\s*<span class="a-offscreen">([^<]*)</span>')
+
+FAST_PATH_STATS = {"pages": 0, "cards": 0, "hits": 0, "fallbacks": 0, "page_fallbacks": 0,
+                   "products": 0, "product_fallbacks": 0}
+
+class _Unsure(Exception):
+    pass
+
+def _card_bounds(html: str) -> list:
+    starts = [m.start() for m in _RE_CARD_START.finditer(html)]
+    if len(starts) != len(_RE_CARD_ANY.findall(html)):
+        return None
+    bounds = []
+    for i, start in enumerate(starts):
+        limit = starts[i + 1] if i + 1 < len(starts) else len(html)
+        depth, end = 0, None
+        for m in _RE_DIV_TAG.finditer(html, start, limit):
+            if m.group(2):
+                continue
+            depth += -1 if m.group(1) else 1
+            if depth == 0:
+                end = m.end()
+                break
+        if end is None:
+            return None
+        card = html[start:end]
+        if card.count("<") != card.count(">") or _RE_RAW_TEXT.search(card):
+            return None
+        bounds.append((start, end))
+    return bounds
+
+def _fast_field(card: str, marker: str, pattern):
+    idx = card.find(marker)
+    if idx < 0:
+        return None
+    m = pattern.match(card, card.rfind("<", 0, idx))
+    if not m:
+        raise _Unsure(marker)
+    return m
+
+def _card_fast(card: str) -> dict:
+    title = href = None
+    h2 = _RE_H2.search(card)
+    if h2:
+        m = _RE_TITLE.match(card, h2.start())
+        href_m = m and _RE_HREF_ATTR.search(m.group(1))
+        if not href_m:
+            raise _Unsure("h2")
+        title, href = unescape(m.group(2)), unescape(href_m.group(1))
+
+    whole = _fast_field(card, "a-price-whole", _RE_WHOLE)
+    frac  = _fast_field(card, "a-price-fraction", _RE_FRAC)
+    orig  = _fast_field(card, "a-text-price", _RE_LIST)
+    return make_card(
+        title,
+        unescape(whole.group(1) + (whole.group(2) or "")) if whole else None,
+        unescape(frac.group(1)) if frac else None,
+        unescape(orig.group(1)) if orig else None,
+        href,
+    )
+
+def _cards_fast(html) -> list:
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    FAST_PATH_STATS["pages"] += 1
+    bounds = _card_bounds(html)
+    if bounds is None:
+        FAST_PATH_STATS["page_fallbacks"] += 1
+        logger.info("fast-path: page layout not recognised, parsed with bs4")
+        return _cards_bs4(html)
+
+    from bs4 import BeautifulSoup
+    cards, hits = [], 0
+    for start, end in bounds:
+        card = html[start:end]
+        try:
+            cards.append(_card_fast(card))
+            hits += 1
+        except _Unsure:
+            it = BeautifulSoup(card, "html.parser").select_one(RESULT_SELECTOR)
+            cards.append(_card_bs4(it))
+    fallbacks = len(bounds) - hits
+    FAST_PATH_STATS["cards"] += len(bounds)
+    FAST_PATH_STATS["hits"] += hits
+    FAST_PATH_STATS["fallbacks"] += fallbacks
+    logger.info(f"fast-path: {hits} hits, {fallbacks} fallbacks")
+    return cards
+
+# ─── Product detail pages ──────────────────────────────────────────────────────
+# /dp/<ASIN> pages have no result cards; the fields come from the buy box.
+# Like cards, a product is the raw text of each field (None when missing).
+# The regex path takes a field only when its marker occurs once on the page
+# and the markup around it is the expected one; anything else parses the
+# page with bs4, strained to the buy-box sections.
+PRODUCT_TITLE_SELECTOR = "#productTitle"
+PRODUCT_PRICE_SELECTOR = ".priceToPay .a-offscreen"
+PRODUCT_LIST_SELECTOR  = ".basisPrice .a-text-price .a-offscreen"
+PRODUCT_AVAIL_SELECTOR = "#availability"
+PRODUCT_SECTIONS = ["productTitle", "apex_desktop", "corePriceDisplay_desktop_feature_div",
+                    "corePrice_feature_div", "availability"]
+
+_RE_P_TITLE = re.compile(r'<span id="productTitle"[^>]*>([^<]*)</span>')
+_RE_P_PRICE = re.compile(r'<span class="a-price [^"]*\bpriceToPay\b[^"]*"[^>]*>\s*<span class="a-offscreen">([^<]*)</span>')
+_RE_P_LIST  = re.compile(r'<span class="[^"]*\bbasisPrice\b[^"]*">[^<]*<span class="a-price a-text-price"[^>]*>\s*'
+                         r'<span class="a-offscreen">([^<]*)</span>')
+_RE_P_AVAIL = re.compile(r'<div id="availability"[^>]*>((?:(?!<div\b|<!|<script\b|<style\b)(?:[^<]|<[^>]*>))*?)</div>')
+_RE_TAG     = re.compile(r'<[^>]*>')
+
+def make_product(title, price, list_price, availability) -> dict:
+    return {
+        "title":        title,
+        "price":        price,
+        "list_price":   list_price,
+        "availability": availability,
+    }
+
+def _product_bs4(html: str, strained: bool = True) -> dict:
+    from bs4 import BeautifulSoup, SoupStrainer
+    only = SoupStrainer(id=PRODUCT_SECTIONS) if strained else None
+    soup = BeautifulSoup(html, "html.parser", parse_only=only)
+    def text(sel):
+        el = soup.select_one(sel)
+        return el.text if el is not None else None
+    return make_product(text(PRODUCT_TITLE_SELECTOR), text(PRODUCT_PRICE_SELECTOR),
+                        text(PRODUCT_LIST_SELECTOR), text(PRODUCT_AVAIL_SELECTOR))
+
+def _product_field(html: str, marker: str, pattern):
+    count = html.count(marker)
+    if count == 0:
+        return None
+    idx = html.find(marker)
+    m = pattern.match(html, html.rfind("<", 0, idx))
+    if count > 1 or not m:
+        raise _Unsure(marker)
+    return m.group(1)
+
+def _product_fast(html: str) -> dict:
+    title = _product_field(html, 'id="productTitle"', _RE_P_TITLE)
+    price = _product_field(html, "priceToPay", _RE_P_PRICE)
+    list_price = _product_field(html, "basisPrice", _RE_P_LIST)
+    avail = _product_field(html, 'id="availability"', _RE_P_AVAIL)
+    return make_product(
+        unescape(title) if title is not None else None,
+        unescape(price) if price is not None else None,
+        unescape(list_price) if list_price is not None else None,
+        unescape(_RE_TAG.sub("", avail)) if avail is not None else None,
+    )
+
+def extract_product(html) -> dict:
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    FAST_PATH_STATS["products"] += 1
+    try:
+        return _product_fast(html)
+    except _Unsure as e:
+        FAST_PATH_STATS["product_fallbacks"] += 1
+        logger.info(f"fast-path: product page not recognised at {e}, parsed with bs4")
+        return _product_bs4(html)
+
+# ─── Backend selection ─────────────────────────────────────────────────────────
+BACKENDS = {
+    "bs4":        _cards_bs4,
+    "lxml":       _cards_lxml,
+    "selectolax": _cards_selectolax,
+    "fast":       _cards_fast,
+}
+
+def extract_cards(html: str, backend: str = None) -> list:
+    name = backend or HTML_PARSER
+    try:
+        parse = BACKENDS[name]
+    except KeyError:
+        raise RuntimeError(f"Unknown HTML_PARSER {name!r}; choose one of {', '.join(BACKENDS)}")
+    return parse(html)
@@ -0,0 +1,114 @@
+# price_history.py
+
+import os
+import json
+import time
+import logging
+from fetch import fetch_all, log_fetch
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+CAMEL_BASE_URL      = os.getenv("CAMEL_BASE_URL", "https://camelcamelcamel.com").rstrip("/")
+HISTORY_CONCURRENCY = int(os.getenv("HISTORY_CONCURRENCY", "4"))
+HISTORY_TTL_HOURS   = float(os.getenv("HISTORY_TTL_HOURS", "24"))
+
+# ─── CamelCamelCamel pages ─────────────────────────────────────────────────────
+def history_url(asin: str) -> str:
+    return f"{CAMEL_BASE_URL}/product/{asin}"
+
+
+def parse_price_history(html: str, url: str) -> dict:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    low = soup.select_one(".stat.lowest span.value")
+    avg = soup.select_one(".stat.average span.value")
+    return {
+        "lowest":  low.text.strip() if low else None,
+        "average": avg.text.strip() if avg else None,
+        "url":     url
+    }
+
+
+def local_history(prices, asin: str):
+    # The same shape as a camelcamelcamel lookup, from our own observations.
+    summary = prices.summary(asin) if prices is not None else None
+    if summary is None:
+        return None
+    return {
+        "lowest":    f"${summary['lowest'] / 100:,.2f}",
+        "average":   f"${summary['average'] / 100:,.2f}",
+        "last":      f"${summary['last'] / 100:,.2f}",
+        "last_seen": summary["last_seen"],
+        "url":       None
+    }
+
+# ─── Per-ASIN cache ────────────────────────────────────────────────────────────
+# {asin: [fetched_at, history]} in one JSON file, read at the start of a run
+# and rewritten once at the end without the expired entries. Only successful
+# lookups are cached, so a failed one is retried next run.
+class HistoryCache:
+    def __init__(self, path: str, ttl_hours: float = HISTORY_TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+        self.dirty = False
+
+    def get(self, asin: str):
+        entry = self.entries.get(asin)
+        if entry is None or time.time() - entry[0] >= self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, asin: str, history: dict) -> None:
+        self.entries[asin] = [time.time(), history]
+        self.dirty = True
+
+    def save(self) -> None:
+        now = time.time()
+        live = {a: e for a, e in self.entries.items() if now - e[0] < self.ttl}
+        if not self.dirty and len(live) == len(self.entries):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(live, f)
+        os.replace(tmp, self.path)
+        self.entries, self.dirty = live, False
+
+# ─── Concurrent lookup ─────────────────────────────────────────────────────────
+async def get_price_histories(asins: list, headers: dict, cache: HistoryCache = None, prices=None,
+                              client=None) -> dict:
+    # asin → history (None when the lookup failed). Answered from the local
+    # price store when it has enough history, then from the cache; the rest
+    # are fetched with at most HISTORY_CONCURRENCY lookups in flight, over
+    # `client` when given.
+    histories, missing, local = {}, [], 0
+    for asin in dict.fromkeys(asins):
+        hit = local_history(prices, asin)
+        if hit is not None:
+            local += 1
+        elif cache:
+            hit = cache.get(asin)
+        if hit is not None:
+            histories[asin] = hit
+        else:
+            missing.append(asin)
+
+    results = await fetch_all([history_url(a) for a in missing], headers, HISTORY_CONCURRENCY, client)
+    for asin, result in zip(missing, results):
+        log_fetch(result)
+        if not result.ok:
+            logger.warning(f"C3 history failed for {asin}: {result.error or result.status}")
+            histories[asin] = None
+            continue
+        histories[asin] = parse_price_history(result.text, history_url(asin))
+        if cache:
+            cache.put(asin, histories[asin])
+    logger.info(f"Price history: {local} local, {len(histories) - len(missing) - local} cached, "
+                f"{len(missing)} fetched")
+    return histories
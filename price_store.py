@@ -0,0 +1,173 @@
+# price_store.py
+
+import os
+import sys
+import time
+import struct
+import logging
+from array import array
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+PRICE_HISTORY_DAYS       = float(os.getenv("PRICE_HISTORY_DAYS", "180"))
+# Observations from earlier runs needed before the local history is used
+# instead of the remote lookup.
+LOCAL_HISTORY_MIN_POINTS = int(os.getenv("LOCAL_HISTORY_MIN_POINTS", "3"))
+# Rewrite the file as a single chunk once it holds this many.
+COMPACT_CHUNKS = 168
+
+# ─── File format ───────────────────────────────────────────────────────────────
+# An append-only run of chunks, one per flush. A chunk is a header (magic,
+# row count) and four columns of that many rows: 10-byte ASINs, uint32
+# timestamps, int32 sale prices in cents and int32 list prices in cents
+# (-1 when none was shown), all big-endian. A torn chunk at the end of the
+# file is ignored.
+CHUNK = struct.Struct(">4sI")
+MAGIC = b"PRC1"
+ROW_BYTES = 10 + 4 + 4 + 4
+
+
+def _column(data, typecode: str) -> array:
+    col = array(typecode)
+    col.frombytes(data)
+    if sys.byteorder == "little":
+        col.byteswap()
+    return col
+
+
+def _raw(col: array) -> bytes:
+    if sys.byteorder == "little":
+        col = array(col.typecode, col)
+        col.byteswap()
+    return col.tobytes()
+
+
+def cents(price: float) -> int:
+    return round(price * 100) if price is not None else -1
+
+
+def _key(asin: str) -> bytes:
+    return asin.encode("ascii", "replace")[:10].ljust(10, b"\0")
+
+# ─── Price store ───────────────────────────────────────────────────────────────
+# In memory each ASIN has its own three parallel arrays (timestamps, sale
+# and list cents), appended in time order. Rows older than
+# PRICE_HISTORY_DAYS are skipped on load and dropped at compaction.
+class PriceStore:
+    def __init__(self, path: str, max_age_days: float = PRICE_HISTORY_DAYS):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        # Whole seconds, like the stored timestamps, so this run's own
+        # observations never sort before it.
+        self.opened = int(time.time())
+        self.series = {}
+        self.pending = []
+        self.chunks = 0
+        self.load()
+
+    def _series(self, asin: bytes) -> tuple:
+        s = self.series.get(asin)
+        if s is None:
+            s = self.series[asin] = (array("I"), array("i"), array("i"))
+        return s
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        cutoff = self.opened - self.max_age
+        view, pos, rows = memoryview(data), 0, 0
+        while pos + CHUNK.size <= len(data):
+            magic, n = CHUNK.unpack_from(data, pos)
+            start, end = pos + CHUNK.size, pos + CHUNK.size + n * ROW_BYTES
+            if magic != MAGIC or end > len(data):
+                logger.warning(f"{self.path}: ignoring {len(data) - pos} unreadable byte(s) at the end")
+                break
+            asins = view[start:start + n * 10]
+            ts = _column(view[start + n * 10:start + n * 14], "I")
+            sale = _column(view[start + n * 14:start + n * 18], "i")
+            lst = _column(view[start + n * 18:end], "i")
+            for i in range(n):
+                if ts[i] < cutoff:
+                    continue
+                s = self._series(bytes(asins[i * 10:i * 10 + 10]))
+                s[0].append(ts[i])
+                s[1].append(sale[i])
+                s[2].append(lst[i])
+            rows += n
+            self.chunks += 1
+            pos = end
+        logger.info(f"Loaded {rows} price observation(s) for {len(self.series)} ASIN(s) from {self.path}")
+
+    def record(self, asin: str, sale: float, list_price: float = None, ts: float = None) -> None:
+        key = _key(asin)
+        row = (key, int(ts or time.time()), cents(sale), cents(list_price))
+        s = self._series(key)
+        s[0].append(row[1])
+        s[1].append(row[2])
+        s[2].append(row[3])
+        self.pending.append(row)
+
+    def sales(self, asin: str, last: int = None) -> array:
+        # Sale prices in cents from runs before this one (so the current
+        # price isn't part of its own history), oldest first; at most the
+        # `last` most recent when given.
+        s = self.series.get(_key(asin))
+        if s is None:
+            return array("i")
+        n = bisect_left(s[0], self.opened)
+        return s[1][max(0, n - last) if last else 0:n]
+
+    def summary(self, asin: str):
+        # Lowest, average and most recent earlier sale price, and when it was
+        # seen; None with fewer than LOCAL_HISTORY_MIN_POINTS observations.
+        s = self.series.get(_key(asin))
+        if s is None:
+            return None
+        n = bisect_left(s[0], self.opened)
+        if n < LOCAL_HISTORY_MIN_POINTS:
+            return None
+        prices = s[1][:n]
+        return {"lowest": min(prices), "average": sum(prices) / n, "last": prices[-1],
+                "last_seen": s[0][n - 1], "points": n}
+
+    def _write_chunk(self, f, rows: list) -> None:
+        f.write(CHUNK.pack(MAGIC, len(rows)))
+        f.write(b"".join(r[0] for r in rows))
+        for col, typecode in ((1, "I"), (2, "i"), (3, "i")):
+            f.write(_raw(array(typecode, (r[col] for r in rows))))
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            self._write_chunk(f, self.pending)
+        self.chunks += 1
+        self.pending.clear()
+        if self.chunks > COMPACT_CHUNKS:
+            self.compact()
+
+    def compact(self) -> None:
+        # One chunk of the live rows, grouped by ASIN; atomic rewrite.
+        self.pending.clear()
+        cutoff = time.time() - self.max_age
+        rows = [(asin, t, sale, lst)
+                for asin, s in self.series.items()
+                for t, sale, lst in zip(*s) if t >= cutoff]
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            self._write_chunk(f, rows)
+        os.replace(tmp, self.path)
+        logger.info(f"Compacted {self.path}: {self.chunks} chunk(s) → 1, {len(rows)} observation(s)")
+        self.chunks = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
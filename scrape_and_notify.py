@@ -1,22 +1,37 @@
 # scrape_and_notify.py
 
 import os
-import json
+import time
 import logging
 import asyncio
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+# The local modules below read their settings from the environment on import.
+load_dotenv()
 from telegram import Bot
+from telegram.error import BadRequest, Forbidden
+from fetch import AMAZON_BASE_URL, CRAWL_CONCURRENCY, get, log_fetch, open_client
+from parsers import extract_cards
+from storage import open_outbox, open_seen_store
+from seen_store import deal_key
+from price_history import HISTORY_CONCURRENCY, HistoryCache, get_price_histories
+from price_store import PriceStore
+from anomaly import ANOMALY_DETECTION, detect
+from send_queue import SendQueue
+from digest import batches, render
+from pipeline import Pipeline, Stage
 
 # ─── Load environment variables ─────────────────────────────────────────────────
-load_dotenv()
 BOT_TOKEN      = os.getenv("TELEGRAM_BOT_TOKEN")
 AFFILIATE_TAG  = os.getenv("AMZN_AFFILIATE_TAG", "amznerrorsca-20")
 RAW_CHANNEL    = os.getenv("TELEGRAM_CHANNEL", "AmznErrorsCA")
 CHANNEL_ID     = RAW_CHANNEL if RAW_CHANNEL.startswith("@") else f"@{RAW_CHANNEL}"
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 DEBUG_PING     = os.getenv("DEBUG_PING", "false").lower() == "true"
+PARSE_WORKERS  = int(os.getenv("PARSE_WORKERS", "0"))
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+# Post each run's deals as packed digests instead of one message per deal.
+CHANNEL_DIGEST   = os.getenv("CHANNEL_DIGEST", "false").lower() == "true"
 
 if not BOT_TOKEN:
     raise RuntimeError("Missing TELEGRAM_BOT_TOKEN in environment variables")
@@ -26,23 +41,7 @@ logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=loggin
 logger = logging.getLogger(__name__)
 
 # ─── Persistence: prevent duplicate alerts ───────────────────────────────────────
-SEEN_FILE = "seen.json"
-def load_seen():
-    try:
-        return json.load(open(SEEN_FILE))
-    except:
-        return {"links": []}
-
-def save_seen(data):
-    json.dump(data, open(SEEN_FILE, "w"), indent=2)
-
-def is_new_deal(link: str) -> bool:
-    seen = load_seen()
-    if link in seen["links"]:
-        return False
-    seen["links"].append(link)
-    save_seen(seen)
-    return True
+DATA_DIR = os.getenv("DATA_DIR", ".")
 
 # ─── HTTP headers ──────────────────────────────────────────────────────────────
 HEADERS = {
@@ -73,103 +72,288 @@ def get_category_urls():
     urls = []
     for path in CATEGORY_PATHS:
         suffix = "&sort=price-asc-rank" if "?" in path else "?sort=price-asc-rank"
-        urls.append(f"https://www.amazon.ca{path}{suffix}")
+        urls.append(f"{AMAZON_BASE_URL}{path}{suffix}")
     logger.info("Will scan these categories:\n" + "\n".join(urls))
     return urls
 
 # ─── Scrape each category for ≥90% discount ───────────────────────────────────
-def scrape_category(url):
-    resp = requests.get(url, headers=HEADERS, timeout=10)
-    soup = BeautifulSoup(resp.text, "html.parser")
-    items = soup.select('div[data-component-type="s-search-result"]')
-    deals = []
-    for it in items:
-        title_el   = it.select_one("h2 a span")
-        sale_whole = it.select_one("span.a-price-whole")
-        sale_frac  = it.select_one("span.a-price-fraction")
-        orig_el    = it.select_one("span.a-price.a-text-price span.a-offscreen")
-        if not (title_el and sale_whole and orig_el):
+def parse_offers(html):
+    # Every priced result card, whether or not it's a deal; orig_price is
+    # None when the card shows no list price.
+    offers = []
+    for card in extract_cards(html):
+        if None in (card["title"], card["price_whole"], card["href"]):
             continue
 
-        sale_str = f"{sale_whole.text.strip().replace(',', '')}.{(sale_frac.text.strip() if sale_frac else '00')}"
-        orig_str = orig_el.text.strip().lstrip('$').replace(',', '')
+        sale_frac = card["price_fraction"]
+        sale_str = f"{card['price_whole'].strip().replace(',', '')}.{(sale_frac.strip() if sale_frac is not None else '00')}"
         try:
             sale_price = float(sale_str)
-            orig_price = float(orig_str)
+            orig_price = None
+            if card["list_price"] is not None:
+                orig_price = float(card["list_price"].strip().lstrip('$').replace(',', ''))
         except ValueError:
             continue
 
+        offers.append({
+            "title":      card["title"].strip(),
+            "sale_price": sale_price,
+            "orig_price": orig_price,
+            "asin":       card["href"].split("/dp/")[-1].split("/")[0]
+        })
+    return offers
+
+def select_deals(offers):
+    deals = []
+    for offer in offers:
+        sale_price, orig_price = offer["sale_price"], offer["orig_price"]
+        if orig_price is None:
+            continue
+
         discount = (orig_price - sale_price) / orig_price * 100
         if discount < 90:
             continue
 
-        asin = it.select_one("h2 a[href]")["href"].split("/dp/")[-1].split("/")[0]
-        link = f"https://www.amazon.ca/dp/{asin}?tag={AFFILIATE_TAG}"
+        link = f"https://www.amazon.ca/dp/{offer['asin']}?tag={AFFILIATE_TAG}"
         deals.append({
-            "title":      title_el.text.strip(),
+            "title":      offer["title"],
             "sale_price": f"{sale_price:.2f}",
             "orig_price": f"{orig_price:.2f}",
             "discount":   f"{int(discount)}%",
             "link":       link,
-            "asin":       asin
+            "asin":       offer["asin"]
         })
     return deals
 
-def scrape_deals():
-    all_deals = []
-    for url in get_category_urls():
-        status = requests.get(url, headers=HEADERS, timeout=10).status_code
-        logger.info(f"GET {url} → {status}")
-        all_deals.extend(scrape_category(url))
-    logger.info(f"Finished scraping {len(CATEGORY_PATHS)} categories, found {len(all_deals)} raw deals")
-    return all_deals
-
-# ─── Price history via CamelCamelCamel ────────────────────────────────────────
-def get_price_history(asin):
-    ccc_url = f"https://camelcamelcamel.com/product/{asin}"
+def anomaly_deals(offers, prices, known):
+    # Offers far below their own price history, as deals measured against
+    # that usual price rather than a list price; ASINs in `known` skipped.
+    deals = []
+    for offer, usual, drop in detect(offers, prices):
+        if offer["asin"] in known:
+            continue
+        known.add(offer["asin"])
+        deals.append({
+            "title":      offer["title"],
+            "sale_price": f"{offer['sale_price']:.2f}",
+            "orig_price": f"{usual:.2f}",
+            "discount":   f"{int(drop)}%",
+            "link":       f"https://www.amazon.ca/dp/{offer['asin']}?tag={AFFILIATE_TAG}",
+            "asin":       offer["asin"],
+            "basis":      "history"
+        })
+    return deals
+
+def parse_category(html):
+    return select_deals(parse_offers(html))
+
+def parse_response(body: bytes, encoding: str):
+    # Process-pool entry point: raw bytes in, offer dicts out.
+    return parse_offers(body.decode(encoding or "utf-8", errors="replace"))
+
+async def crawl(*downstream, prices=None, seen=None):
+    # Runs fetch → parse → filter over every category, then the
+    # `downstream` stages on each category's batch of deals. With a
+    # PriceStore every offer is recorded in it, deal or not; with a seen
+    # store, deals it has already posted are left out (checked only).
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor(PARSE_WORKERS) if PARSE_WORKERS > 0 else None
+
+    async def fetch_page(url):
+        return [await get(client, url)]
+
+    async def parse_page(result):
+        log_fetch(result)
+        # Off the event loop either way, so sends and fetches carry on
+        # while a page is parsed.
+        if pool:
+            return [await loop.run_in_executor(pool, parse_response, result.body, result.encoding)]
+        return [await asyncio.to_thread(parse_offers, result.text)]
+
+    async def filter_offers(offers):
+        if prices is not None:
+            for o in offers:
+                prices.record(o["asin"], o["sale_price"], o["orig_price"])
+        deals = select_deals(offers)
+        if prices is not None and ANOMALY_DETECTION:
+            deals += anomaly_deals(offers, prices, {d["asin"] for d in deals})
+        if seen is not None:
+            deals = [d for d in deals if seen.is_new_deal(d["asin"], float(d["sale_price"]))]
+        return [deals] if deals else []
+
     try:
-        resp = requests.get(ccc_url, headers=HEADERS, timeout=10)
-        soup = BeautifulSoup(resp.text, "html.parser")
-        low = soup.select_one(".stat.lowest span.value")
-        avg = soup.select_one(".stat.average span.value")
-        return {
-            "lowest":  low.text.strip() if low else None,
-            "average": avg.text.strip() if avg else None,
-            "url":     ccc_url
-        }
-    except Exception as e:
-        logger.warning(f"C3 history failed for {asin}: {e}")
-        return None
+        async with open_client(HEADERS) as client:
+            await Pipeline(
+                Stage("fetch", fetch_page, workers=CRAWL_CONCURRENCY),
+                Stage("parse", parse_page, workers=max(1, PARSE_WORKERS)),
+                Stage("filter", filter_offers),
+                *downstream,
+            ).run(get_category_urls())
+    finally:
+        if pool:
+            pool.shutdown()
+
+async def scrape_deals(prices=None):
+    # Every deal the crawl finds, whether posted before or not.
+    deals = []
+
+    async def collect(batch):
+        deals.extend(batch)
+
+    await crawl(Stage("collect", collect), prices=prices)
+    logger.info(f"Finished scraping {len(CATEGORY_PATHS)} categories, found {len(deals)} raw deals")
+    return deals
+
+# ─── Message formatting ────────────────────────────────────────────────────────
+def was(deal: dict) -> str:
+    if deal.get("basis") == "history":
+        return f"usually ${deal['orig_price']}"
+    return f"was ${deal['orig_price']}"
+
+def history_text(hist) -> str:
+    # Our own price store also knows the last price seen before this run.
+    if not hist or not hist["lowest"]:
+        return ""
+    text = f"\n📈 Lowest: {hist['lowest']} | Avg: {hist['average']}"
+    if hist.get("last"):
+        text += f" | Last: {hist['last']} ({time.strftime('%b %d', time.gmtime(hist['last_seen']))})"
+    return text
+
+def format_post(deal: dict, hist_text: str) -> str:
+    return (
+        f"🔥 *PRICE ERROR!* 🔥\n\n"
+        f"🛍️ *{deal['title']}*\n"
+        f"💸 Now: ${deal['sale_price']} ({was(deal)})\n"
+        f"📉 {deal['discount']}{hist_text}\n\n"
+        f"[Buy Now]({deal['link']})"
+    )
+
+def format_digest_entry(deal: dict, hist_text: str) -> str:
+    return (
+        f"🛍️ *{deal['title']}*\n"
+        f"💸 ${deal['sale_price']} ({was(deal)}) · 📉 {deal['discount']}{hist_text}\n"
+        f"[Buy Now]({deal['link']})"
+    )
+
+# ─── Outbox delivery ───────────────────────────────────────────────────────────
+DIGEST_HEADER = "🔥 *PRICE ERRORS!* 🔥"
+
+def outbox_key(deal: dict) -> str:
+    # Same identity as the seen store: ASIN plus price bucket, per chat.
+    return f"{CHANNEL_ID}:{deal_key(deal['asin'], float(deal['sale_price'])).hex()}"
+
+def queue_posts(outbox, sender, entries, delivered) -> list:
+    # Queues outbox entries (key, chat_id, text) for sending, packed into
+    # digests with CHANNEL_DIGEST, and records each post as delivered the
+    # moment Telegram accepts it, adding its keys to `delivered`. Returns
+    # the send futures.
+    by_chat = {}
+    for key, chat_id, text in entries:
+        by_chat.setdefault(chat_id, []).append((key, text))
+
+    def record(keys):
+        def done(future):
+            if future.result() is not None:
+                outbox.mark_sent(keys)
+                delivered.extend(keys)
+        return done
+
+    def failed(keys):
+        # Retried next run, unless Telegram will never take it.
+        def on_error(error):
+            outbox.mark_failed(keys, str(error), permanent=isinstance(error, (BadRequest, Forbidden)))
+        return on_error
+
+    futures = []
+    for chat_id, items in by_chat.items():
+        if CHANNEL_DIGEST:
+            posts, i = [], 0
+            for group in batches([text for _, text in items], DIGEST_HEADER):
+                posts.append(([key for key, _ in items[i:i + len(group)]], render(group, DIGEST_HEADER)))
+                i += len(group)
+        else:
+            posts = [([key], text) for key, text in items]
+        for keys, text in posts:
+            future = sender.put(chat_id, text, on_error=failed(keys), parse_mode="Markdown",
+                                disable_web_page_preview=True)
+            future.add_done_callback(record(keys))
+            futures.append(future)
+    return futures
 
 # ─── Async runner ─────────────────────────────────────────────────────────────
+# The run is a pipeline, one category page at a time:
+#   fetch → parse → filter (price store, deal rules, seen check)
+#         → enrich (price history, formatting)
+#         → send (outbox, seen store, send queue)
+# so a deal is posted as soon as its own category has been parsed rather
+# than after the whole crawl. A deal is recorded as seen only once its post
+# is in the outbox, and the seen store is saved only if the whole run got
+# through, so deals still in flight when a stage fails are offered again
+# next run; the outbox keys keep anything already queued from going out
+# twice. With CHANNEL_DIGEST the outbox is posted once the crawl is done,
+# packed into as few messages as possible.
 async def run_and_notify():
-    bot = Bot(BOT_TOKEN)
-    sent = 0
-
-    for deal in scrape_deals():
-        if is_new_deal(deal["link"]):
-            sent += 1
-            hist = get_price_history(deal["asin"])
-            hist_text = ""
-            if hist and hist["lowest"]:
-                hist_text = f"\n📈 Lowest: {hist['lowest']} | Avg: {hist['average']}"
-            text = (
-                f"🔥 *PRICE ERROR!* 🔥\n\n"
-                f"🛍️ *{deal['title']}*\n"
-                f"💸 Now: ${deal['sale_price']} (was ${deal['orig_price']})\n"
-                f"📉 {deal['discount']}{hist_text}\n\n"
-                f"[Buy Now]({deal['link']})"
-            )
-            await bot.send_message(
-                chat_id=CHANNEL_ID, text=text,
-                parse_mode="Markdown", disable_web_page_preview=True
-            )
-
-    logger.info(f"Sent {sent} new deal(s).")
-
-    if DEBUG_PING:
-        await bot.send_message(chat_id=CHANNEL_ID,
-                               text="✅ Debug ping: GitHub Actions reached your Telegram channel!")
+    bot = Bot(BOT_TOKEN, base_url=f"{TELEGRAM_API_URL}/bot")
+    fmt = format_digest_entry if CHANNEL_DIGEST else format_post
+    outbox = open_outbox(DATA_DIR)
+    cache = HistoryCache(os.path.join(DATA_DIR, "price_history.json"))
+    started = time.perf_counter()
+    delivered, post_times = [], []
+    new = 0
+
+    def timed(futures):
+        def done(future):
+            if future.result() is not None:
+                post_times.append(time.perf_counter() - started)
+        for future in futures:
+            future.add_done_callback(done)
+
+    async with SendQueue(bot) as sender:
+        if not CHANNEL_DIGEST:
+            queue_posts(outbox, sender, outbox.pending(), delivered)
+
+        with open_seen_store(DATA_DIR) as seen, PriceStore(os.path.join(DATA_DIR, "prices.bin")) as prices:
+            async def enrich(deals):
+                histories = await get_price_histories([d["asin"] for d in deals], HEADERS, cache, prices,
+                                                      history_client)
+                posts = []
+                for deal in deals:
+                    hist = histories.get(deal["asin"])
+                    posts.append((deal, outbox_key(deal), fmt(deal, history_text(hist))))
+                return [posts]
+
+            async def send(posts):
+                nonlocal new
+                fresh = []
+                for deal, key, text in posts:
+                    # Checked again: the same deal may come from two categories.
+                    if not seen.is_new_deal(deal["asin"], float(deal["sale_price"])):
+                        continue
+                    # A False enqueue means the outbox already holds this
+                    # post from a failed run; it's seen either way.
+                    if outbox.enqueue(key, CHANNEL_ID, text):
+                        fresh.append((key, CHANNEL_ID, text))
+                    seen.add_deal(deal["asin"], float(deal["sale_price"]))
+                new += len(fresh)
+                if not CHANNEL_DIGEST:
+                    timed(queue_posts(outbox, sender, fresh, delivered))
+
+            # One pool for the whole run's price-history lookups.
+            async with open_client(HEADERS, HISTORY_CONCURRENCY) as history_client:
+                await crawl(Stage("enrich", enrich), Stage("send", send), prices=prices, seen=seen)
+            cache.save()
+
+        if CHANNEL_DIGEST:
+            timed(queue_posts(outbox, sender, outbox.pending(), delivered))
+        if DEBUG_PING:
+            sender.put(CHANNEL_ID, "✅ Debug ping: GitHub Actions reached your Telegram channel!")
+
+    outbox.compact()
+    logger.info(f"Found {new} new deal(s); delivered {len(delivered)} post(s), "
+                f"{len(outbox.pending())} left pending in the outbox.")
+    if post_times:
+        logger.info(f"New posts accepted by Telegram {min(post_times):.2f}s (first) to "
+                    f"{max(post_times):.2f}s (last) after the run started")
 
 if __name__ == "__main__":
     asyncio.run(run_and_notify())
@@ -0,0 +1,207 @@
+# seen_store.py
+
+import os
+import re
+import json
+import math
+import time
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+SEEN_TTL_DAYS    = float(os.getenv("SEEN_TTL_DAYS", "30"))
+PRICE_BUCKET_PCT = float(os.getenv("PRICE_BUCKET_PCT", "5"))
+# Rewrite the log once it holds this many records per live entry.
+COMPACT_RATIO = 2
+
+# ─── Canonical deal keys ───────────────────────────────────────────────────────
+# A deal is identified by its ASIN and a log-scale price bucket (each bucket
+# PRICE_BUCKET_PCT% wide), packed into 12 bytes: the 10 ASIN characters and
+# the bucket as a big-endian uint16. Big-endian keeps byte order equal to
+# bucket order, so "deeper than anything posted for this ASIN" is a plain
+# bytes comparison. Affiliate tags and URL formats never enter the key.
+KEY_SIZE   = 12
+RECORD     = struct.Struct(f">{KEY_SIZE}sIi")   # key, first_seen, last price in cents (-1 = unknown)
+RE_DP_ASIN = re.compile(r"/dp/([A-Z0-9]{10})")
+
+
+def price_bucket(price: float, pct: float = PRICE_BUCKET_PCT) -> int:
+    cents = round(price * 100)
+    if cents <= 1:
+        return 0
+    return min(int(math.log(cents) / math.log1p(pct / 100)), 0xFFFF)
+
+
+def deal_key(asin: str, price: float) -> bytes:
+    return asin.encode("ascii", "replace")[:10].ljust(10, b"\0") + price_bucket(price).to_bytes(2, "big")
+
+
+def legacy_key(link: str, price: float = None):
+    # Older stores keyed on the full link. Without a known price the entry
+    # takes bucket 0 so it keeps suppressing the ASIN at any price until it
+    # expires, rather than flooding the channel once after the upgrade.
+    m = RE_DP_ASIN.search(link)
+    if not m:
+        return None
+    return deal_key(m.group(1), price if price is not None else 0)
+
+# ─── Seen-deal store ───────────────────────────────────────────────────────────
+# Entries live in an in-memory dict for the run: key → [first_seen, last_price],
+# with a second dict holding the lowest live bucket per ASIN. An entry older
+# than the TTL counts as unseen, so a product that errors again later is
+# posted again. The file is an append-only log of fixed-width records (the
+# last record for a key wins), written once by flush() and compacted down to
+# the live entries when it has grown well past them. Older text logs and
+# seen.json are imported the first time.
+class SeenStore:
+    def __init__(self, path: str, legacy_paths: tuple = (), ttl_days: float = SEEN_TTL_DAYS):
+        self.path = path
+        self.legacy_paths = legacy_paths
+        self.ttl = ttl_days * 86400
+        self.entries = {}
+        self.lowest = {}
+        self.pending = []
+        self.log_records = 0
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._import_legacy()
+        else:
+            usable = len(data) - len(data) % RECORD.size
+            for key, first_seen, cents in RECORD.iter_unpack(data[:usable]):
+                self.entries[key] = [float(first_seen), cents / 100 if cents >= 0 else None]
+            self.log_records = usable // RECORD.size
+        self.expire()
+        logger.info(f"Loaded {len(self.entries)} seen deal(s) from {self.path}")
+
+    def _import_legacy(self) -> None:
+        now = time.time()
+        for path in self.legacy_paths:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    if path.endswith(".json"):
+                        rows = [[link] for link in json.load(f).get("links", [])]
+                    else:
+                        rows = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            for row in rows:
+                price = float(row[2]) if len(row) > 2 and row[2] else None
+                key = legacy_key(row[0], price)
+                if key:
+                    first_seen = float(row[1]) if len(row) > 1 else now
+                    self._put(key, first_seen, price)
+                    self.pending.append(key)
+            logger.info(f"Imported {len(self.pending)} seen deal(s) from {path}")
+            return
+
+    def expired(self, entry: list, now: float) -> bool:
+        return self.ttl > 0 and now - entry[0] >= self.ttl
+
+    def expire(self, now: float = None) -> int:
+        now = now or time.time()
+        stale = [k for k, e in self.entries.items() if self.expired(e, now)]
+        for k in stale:
+            del self.entries[k]
+        self.lowest.clear()
+        for k in self.entries:
+            self._track(k)
+        return len(stale)
+
+    def _track(self, key: bytes) -> None:
+        asin, bucket = key[:10], key[10:]
+        if asin not in self.lowest or bucket < self.lowest[asin]:
+            self.lowest[asin] = bucket
+
+    def _fetch(self, asin: bytes) -> None:
+        # Hook for stores that don't hold every entry in memory.
+        pass
+
+    def _put(self, key: bytes, first_seen: float, price: float) -> None:
+        self.entries[key] = [first_seen, price]
+        self._track(key)
+
+    def __contains__(self, key: bytes) -> bool:
+        entry = self.entries.get(key)
+        return entry is not None and not self.expired(entry, time.time())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, key: bytes, price: float = None) -> bool:
+        # True when the key was new (or its entry had expired).
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and not self.expired(entry, now):
+            if price is not None and price != entry[1]:
+                entry[1] = price
+                self.pending.append(key)
+            return False
+        self._put(key, now, price)
+        self.pending.append(key)
+        return True
+
+    def _deeper_seen(self, key: bytes) -> bool:
+        self._fetch(key[:10])
+        lowest = self.lowest.get(key[:10])
+        return lowest is not None and lowest < key[10:] and (key[:10] + lowest) in self
+
+    def is_new_deal(self, asin: str, price: float) -> bool:
+        # What add_deal would answer, without recording anything.
+        key = deal_key(asin, price)
+        return not self._deeper_seen(key) and key not in self
+
+    def add_deal(self, asin: str, price: float) -> bool:
+        # True when this ASIN hasn't been posted, or only at higher price
+        # buckets than this one (a deeper drop).
+        key = deal_key(asin, price)
+        if self._deeper_seen(key):
+            return False
+        return self.add(key, price)
+
+    def _record(self, key: bytes) -> bytes:
+        first_seen, price = self.entries[key]
+        return RECORD.pack(key, int(first_seen), round(price * 100) if price is not None else -1)
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        records = [self._record(k) for k in dict.fromkeys(self.pending) if k in self.entries]
+        with open(self.path, "ab") as f:
+            f.write(b"".join(records))
+        self.log_records += len(records)
+        self.pending.clear()
+        if self.log_records > COMPACT_RATIO * len(self.entries) + 100:
+            self.compact()
+
+    def compact(self) -> None:
+        # Drop expired entries and superseded records; atomic rewrite. It's
+        # written from memory, so unflushed entries are included anyway.
+        self.pending.clear()
+        dropped = self.expire()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(self._record(k) for k in self.entries))
+        os.replace(tmp, self.path)
+        logger.info(f"Compacted {self.path}: {self.log_records} → {len(self.entries)} record(s), "
+                    f"{dropped} expired")
+        self.log_records = len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # A block that raised may have accepted deals it never got to post
+        # or queue; saving them would suppress them until they expire.
+        if exc_type is not None:
+            logger.warning(f"Not saving {len(self.pending)} seen change(s) after an error")
+            return
+        self.flush()
@@ -0,0 +1,176 @@
+# send_queue.py
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import timedelta
+from telegram.error import RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+# Telegram allows about 30 messages/s overall, 1/s per private chat and
+# 20/min per group or channel; going over gets 429 retry_after replies.
+SEND_GLOBAL_RATE  = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE    = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE   = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+SEND_CONCURRENCY  = int(os.getenv("SEND_CONCURRENCY", "8"))
+SEND_MAX_RETRIES  = 5
+# Pace at this share of the limits above, so timer jitter on either side
+# doesn't land a send a hair early and earn a 429.
+SEND_HEADROOM     = 0.9
+SEND_REPORT_EVERY = 30   # seconds between progress lines while sending
+
+# ─── Token bucket ──────────────────────────────────────────────────────────────
+# take() books the next free slot and returns how long to sleep until it,
+# so callers sharing a bucket are spaced out in the order they arrived
+# instead of polling. The balance may go negative: that's the backlog.
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self) -> float:
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        # The server asked us to back off: nothing until `seconds` from now.
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def is_group(chat_id) -> bool:
+    # Channels (@name) and groups (negative ids) share the slower limit.
+    return str(chat_id).startswith(("@", "-"))
+
+# ─── Send queue ────────────────────────────────────────────────────────────────
+# put() never blocks: messages go into one FIFO lane per chat, each drained
+# by its own task, so a chat's messages keep their order while other chats
+# proceed. A send first waits for its chat's bucket, then for a slot under
+# the concurrency limit and the global bucket. RetryAfter pushes the chat's
+# bucket back by retry_after and the message is tried again; other Telegram
+# errors are logged and the message dropped. Each put() returns a future
+# resolving to the sent Message, or None when it couldn't be delivered; an
+# `on_error` callback is then called with the last error.
+class SendQueue:
+    def __init__(self, bot=None, concurrency: int = SEND_CONCURRENCY):
+        self.bot = bot
+        self.sem = asyncio.Semaphore(concurrency)
+        self.global_bucket = TokenBucket(SEND_GLOBAL_RATE * SEND_HEADROOM)
+        self.chat_buckets = {}
+        self.lanes = {}
+        self.tasks = set()
+        self.depth = 0
+        self.max_depth = 0
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retried": 0}
+        self.started = None
+        self.sent_before = 0
+        self.reported = time.monotonic()
+
+    def put(self, chat_id, text: str, on_error=None, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        lane = self.lanes.get(chat_id)
+        if lane is None:
+            lane = self.lanes[chat_id] = deque()
+            task = asyncio.create_task(self._drain(chat_id, lane))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        lane.append(({"chat_id": chat_id, "text": text, **kwargs}, future, on_error))
+        if self.started is None:
+            self.started = time.monotonic()
+            self.sent_before = self.stats["sent"]
+        self.stats["queued"] += 1
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        return future
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = SEND_GROUP_RATE if is_group(chat_id) else SEND_CHAT_RATE
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate * SEND_HEADROOM)
+        return bucket
+
+    async def _drain(self, chat_id, lane: deque) -> None:
+        bucket = self._bucket(chat_id)
+        while lane:
+            params, future, on_error = lane[0]
+            message, error = await self._send(bucket, params)
+            lane.popleft()
+            if message is None and on_error:
+                on_error(error)
+            self.depth -= 1
+            if not future.done():
+                future.set_result(message)
+            self._report(final=self.depth == 0)
+        del self.lanes[chat_id]
+
+    async def _send(self, bucket: TokenBucket, params: dict) -> tuple:
+        # (message, None) once sent, (None, error) when given up on.
+        error = None
+        for _ in range(SEND_MAX_RETRIES + 1):
+            await asyncio.sleep(bucket.take())
+            async with self.sem:
+                await asyncio.sleep(self.global_bucket.take())
+                try:
+                    message = await self.bot.send_message(**params)
+                except RetryAfter as e:
+                    error = e
+                    delay = e.retry_after
+                    if isinstance(delay, timedelta):
+                        delay = delay.total_seconds()
+                    self.stats["retried"] += 1
+                    bucket.pause(delay)
+                    logger.warning(f"Send to {params['chat_id']}: 429, retrying in {delay}s")
+                    continue
+                except TelegramError as e:
+                    self.stats["failed"] += 1
+                    logger.warning(f"Send to {params['chat_id']} failed: {e}")
+                    return None, e
+            self.stats["sent"] += 1
+            return message, None
+        self.stats["failed"] += 1
+        logger.warning(f"Send to {params['chat_id']} dropped after {SEND_MAX_RETRIES} retries")
+        return None, error
+
+    def throughput(self) -> float:
+        # Messages/s since the queue last went from empty to busy.
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return (self.stats["sent"] - self.sent_before) / elapsed if elapsed > 0 else 0.0
+
+    def _report(self, final: bool = False) -> None:
+        # A progress line every SEND_REPORT_EVERY seconds while busy, and a
+        # summary each time the queue drains.
+        now = time.monotonic()
+        if final:
+            logger.info(f"Send queue drained: {self.stats['sent']} sent, {self.stats['failed']} failed, "
+                        f"{self.stats['retried']} retried after 429, {self.throughput():.1f} msg/s, "
+                        f"max depth {self.max_depth}")
+            self.started = None
+        elif now - self.reported >= SEND_REPORT_EVERY:
+            logger.info(f"Send queue: {self.stats['sent']} sent, {self.depth} waiting in "
+                        f"{len(self.lanes)} chat(s), {self.throughput():.1f} msg/s")
+        else:
+            return
+        self.reported = now
+
+    async def join(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*self.tasks)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.join()
@@ -0,0 +1,465 @@
+# storage.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+from bloom import BloomFilter
+from seen_store import SEEN_TTL_DAYS, SeenStore, legacy_key
+from outbox import OUTBOX_MAX_ATTEMPTS, Outbox
+
+logger = logging.getLogger(__name__)
+
+# ─── Config ────────────────────────────────────────────────────────────────────
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json").lower()
+STATE_DB_NAME = "state.db"
+# Bits in the Bloom filter kept in front of the SQLite seen table (0 = off);
+# about 10 bits per seen ASIN gives a ~1% false-positive rate.
+SEEN_BLOOM_BITS = int(os.getenv("SEEN_BLOOM_BITS", "0"))
+
+# ─── JSON helpers ──────────────────────────────────────────────────────────────
+def load_json(path: str) -> dict:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_json(path: str, data: dict) -> None:
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+# ─── JSON backend ──────────────────────────────────────────────────────────────
+# The original layout: {chat_id: {category: min_discount}} in subscriptions.json
+# and {chat_id: {item: min_drop}} in alerts.json, rewritten on every change.
+# Per-chat preferences go in settings.json as {chat_id: {"digest": bool}},
+# and the price bucket each chat was last alerted at for an ASIN in
+# alert_notices.json as {chat_id: {asin: bucket}}.
+class JsonState:
+    def __init__(self, data_dir: str):
+        self.subs_file = os.path.join(data_dir, "subscriptions.json")
+        self.alerts_file = os.path.join(data_dir, "alerts.json")
+        self.settings_file = os.path.join(data_dir, "settings.json")
+        self.notices_file = os.path.join(data_dir, "alert_notices.json")
+
+    def subscribe(self, uid: str, cat: str, min_d: int) -> None:
+        data = load_json(self.subs_file)
+        data.setdefault(uid, {})[cat] = min_d
+        save_json(self.subs_file, data)
+
+    def unsubscribe(self, uid: str, cat: str) -> bool:
+        data = load_json(self.subs_file)
+        if uid not in data or cat not in data[uid]:
+            return False
+        del data[uid][cat]
+        save_json(self.subs_file, data)
+        return True
+
+    def subscriptions_for(self, uid: str) -> dict:
+        return load_json(self.subs_file).get(uid, {})
+
+    def all_subscriptions(self) -> dict:
+        return load_json(self.subs_file)
+
+    def set_alert(self, uid: str, item: str, min_d: int) -> None:
+        data = load_json(self.alerts_file)
+        data.setdefault(uid, {})[item] = min_d
+        save_json(self.alerts_file, data)
+        # A new or changed alert starts afresh.
+        self.set_alert_notices({(uid, alert_asin(item)): None})
+
+    def all_alerts(self) -> dict:
+        return load_json(self.alerts_file)
+
+    def alert_notices(self) -> dict:
+        return load_json(self.notices_file)
+
+    def set_alert_notices(self, changes: dict) -> None:
+        # {(uid, asin): bucket, or None to forget it}
+        data = load_json(self.notices_file)
+        for (uid, asin), bucket in changes.items():
+            if bucket is not None:
+                data.setdefault(uid, {})[asin] = bucket
+            elif asin in data.get(uid, {}):
+                del data[uid][asin]
+        save_json(self.notices_file, data)
+
+    def set_digest(self, uid: str, enabled: bool) -> None:
+        data = load_json(self.settings_file)
+        data.setdefault(uid, {})["digest"] = enabled
+        save_json(self.settings_file, data)
+
+    def digest_chats(self) -> set:
+        return {uid for uid, prefs in load_json(self.settings_file).items() if prefs.get("digest")}
+
+# ─── SQLite (WAL) backend ──────────────────────────────────────────────────────
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    chat_id      TEXT    NOT NULL,
+    category     TEXT    NOT NULL,
+    min_discount INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, category)
+);
+CREATE INDEX IF NOT EXISTS subscriptions_category ON subscriptions (category);
+CREATE TABLE IF NOT EXISTS alerts (
+    chat_id  TEXT    NOT NULL,
+    item     TEXT    NOT NULL,
+    asin     TEXT,
+    min_drop INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, item)
+);
+CREATE INDEX IF NOT EXISTS alerts_asin ON alerts (asin);
+CREATE TABLE IF NOT EXISTS alert_notices (
+    chat_id TEXT    NOT NULL,
+    asin    TEXT    NOT NULL,
+    bucket  INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, asin)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seen (
+    key        BLOB PRIMARY KEY,
+    first_seen REAL,
+    last_price REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS settings (
+    chat_id TEXT    PRIMARY KEY,
+    digest  INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    key      TEXT PRIMARY KEY,
+    chat_id  TEXT NOT NULL,
+    text     TEXT NOT NULL,
+    enqueued REAL NOT NULL,
+    sent     REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    dead     TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA busy_timeout=5000")
+    db.executescript(SCHEMA)
+    columns = {row[1] for row in db.execute("PRAGMA table_info(seen)")}
+    if "first_seen" not in columns:
+        with db:
+            db.execute("ALTER TABLE seen ADD COLUMN first_seen REAL")
+            db.execute("ALTER TABLE seen ADD COLUMN last_price REAL")
+            db.execute("UPDATE seen SET first_seen = strftime('%s', 'now')")
+    columns = {row[1] for row in db.execute("PRAGMA table_info(outbox)")}
+    if "attempts" not in columns:
+        with db:
+            db.execute("ALTER TABLE outbox ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            db.execute("ALTER TABLE outbox ADD COLUMN dead TEXT")
+    return db
+
+
+# Alerts take a bare ASIN or any amazon product URL (/dp/, /gp/product/,
+# /gp/aw/d/, with or without a title slug or query string).
+RE_ASIN     = re.compile(r"[A-Z0-9]{10}", re.I)
+RE_URL_ASIN = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?![A-Z0-9])", re.I)
+
+
+def alert_asin(item: str):
+    item = item.strip()
+    if RE_ASIN.fullmatch(item):
+        return item.upper()
+    m = RE_URL_ASIN.search(item)
+    return m.group(1).upper() if m else None
+
+
+class SqliteState:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def subscribe(self, uid: str, cat: str, min_d: int) -> None:
+        with self.db:
+            self.db.execute("INSERT INTO subscriptions VALUES (?, ?, ?) "
+                            "ON CONFLICT (chat_id, category) DO UPDATE SET min_discount = excluded.min_discount",
+                            (uid, cat, min_d))
+
+    def unsubscribe(self, uid: str, cat: str) -> bool:
+        with self.db:
+            cur = self.db.execute("DELETE FROM subscriptions WHERE chat_id = ? AND category = ?", (uid, cat))
+        return cur.rowcount > 0
+
+    def subscriptions_for(self, uid: str) -> dict:
+        rows = self.db.execute("SELECT category, min_discount FROM subscriptions WHERE chat_id = ?", (uid,))
+        return dict(rows)
+
+    def all_subscriptions(self) -> dict:
+        data = {}
+        for uid, cat, min_d in self.db.execute("SELECT chat_id, category, min_discount FROM subscriptions"):
+            data.setdefault(uid, {})[cat] = min_d
+        return data
+
+    def set_alert(self, uid: str, item: str, min_d: int) -> None:
+        with self.db:
+            self.db.execute("INSERT INTO alerts VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (chat_id, item) DO UPDATE SET min_drop = excluded.min_drop",
+                            (uid, item, alert_asin(item), min_d))
+            self.db.execute("DELETE FROM alert_notices WHERE chat_id = ? AND asin = ?", (uid, alert_asin(item)))
+
+    def all_alerts(self) -> dict:
+        data = {}
+        for uid, item, min_d in self.db.execute("SELECT chat_id, item, min_drop FROM alerts"):
+            data.setdefault(uid, {})[item] = min_d
+        return data
+
+    def alert_notices(self) -> dict:
+        data = {}
+        for uid, asin, bucket in self.db.execute("SELECT chat_id, asin, bucket FROM alert_notices"):
+            data.setdefault(uid, {})[asin] = bucket
+        return data
+
+    def set_alert_notices(self, changes: dict) -> None:
+        with self.db:
+            self.db.executemany("INSERT INTO alert_notices VALUES (?, ?, ?) ON CONFLICT (chat_id, asin) "
+                                "DO UPDATE SET bucket = excluded.bucket",
+                                ((uid, asin, b) for (uid, asin), b in changes.items() if b is not None))
+            self.db.executemany("DELETE FROM alert_notices WHERE chat_id = ? AND asin = ?",
+                                (key for key, b in changes.items() if b is None))
+
+    def set_digest(self, uid: str, enabled: bool) -> None:
+        with self.db:
+            self.db.execute("INSERT INTO settings (chat_id, digest) VALUES (?, ?) "
+                            "ON CONFLICT (chat_id) DO UPDATE SET digest = excluded.digest", (uid, int(enabled)))
+
+    def digest_chats(self) -> set:
+        return {uid for (uid,) in self.db.execute("SELECT chat_id FROM settings WHERE digest")}
+
+
+class SqliteSeenStore(SeenStore):
+    # Same in-memory entries, TTL and single flush as SeenStore, persisted to
+    # the `seen` table instead of the append-only log. With a Bloom filter
+    # (SEEN_BLOOM_BITS) the table isn't loaded up front: an ASIN the filter
+    # has never seen is new without touching SQLite, and only possible hits
+    # are looked up, one indexed key-range query per ASIN.
+    def __init__(self, db: sqlite3.Connection, ttl_days: float = SEEN_TTL_DAYS,
+                 bloom_path: str = None, bloom_bits: int = 0):
+        self.db = db
+        self.bloom_path = bloom_path
+        self.bloom_bits = bloom_bits
+        self.bloom = None
+        self.fetched = set()
+        super().__init__(STATE_DB_NAME, ttl_days=ttl_days)
+
+    def load(self) -> None:
+        legacy = list(self.db.execute("SELECT key, first_seen, last_price FROM seen WHERE typeof(key) = 'text'"))
+        if self.bloom_bits:
+            self._load_bloom()
+        else:
+            rows = self.db.execute("SELECT key, first_seen, last_price FROM seen WHERE typeof(key) = 'blob'")
+            self.entries.update((k, [first_seen, last_price]) for k, first_seen, last_price in rows)
+        if legacy:
+            self._convert_links(legacy)
+        self.expire()
+        if self.bloom:
+            logger.info(f"Seen store: SQLite lookups behind a {self.bloom.bits}-bit Bloom filter")
+        else:
+            logger.info(f"Loaded {len(self.entries)} seen deal(s) from SQLite")
+
+    def _convert_links(self, rows: list) -> None:
+        # Rows written before canonical keys hold the full deal link.
+        for link, first_seen, last_price in rows:
+            key = legacy_key(link, last_price)
+            if key and key not in self.entries:
+                self._put(key, first_seen, last_price)
+                self.pending.append(key)
+        self.flush()
+        with self.db:
+            self.db.execute("DELETE FROM seen WHERE typeof(key) = 'text'")
+        logger.info(f"Converted {len(rows)} link-keyed seen row(s) to canonical keys")
+
+    def _generation(self, bump: bool = False) -> int:
+        if bump:
+            self.db.execute("INSERT INTO meta VALUES ('seen_generation', 1) "
+                            "ON CONFLICT (name) DO UPDATE SET value = value + 1")
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'seen_generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _load_bloom(self) -> None:
+        # The saved filter is reused only if no writer has touched the table
+        # since it was saved; otherwise it's rebuilt from the keys.
+        generation = self._generation()
+        bloom = BloomFilter.load(self.bloom_path)
+        if bloom is None or bloom.generation != generation or bloom.bits != self.bloom_bits:
+            bloom = self._rebuild_bloom(generation)
+        self.bloom = bloom
+
+    def _rebuild_bloom(self, generation: int) -> BloomFilter:
+        bloom = BloomFilter(self.bloom_bits, generation=generation)
+        count = 0
+        for (k,) in self.db.execute("SELECT key FROM seen WHERE typeof(key) = 'blob'"):
+            bloom.add(k[:10])
+            count += 1
+        bloom.save(self.bloom_path)
+        logger.info(f"Rebuilt Bloom filter from {count} seen key(s)")
+        return bloom
+
+    def _fetch(self, asin: bytes) -> None:
+        if self.bloom is None or asin in self.fetched:
+            return
+        self.fetched.add(asin)
+        if asin not in self.bloom:
+            return
+        rows = self.db.execute("SELECT key, first_seen, last_price FROM seen WHERE key BETWEEN ? AND ?",
+                               (asin + b"\0\0", asin + b"\xff\xff")).fetchall()
+        # Expired rows stay out, as they would after a full load and
+        # expire(), so they can't stand in as this ASIN's lowest bucket.
+        now = time.time()
+        for k, first_seen, last_price in rows:
+            if k not in self.entries and not self.expired([first_seen, last_price], now):
+                self.entries[k] = [first_seen, last_price]
+                self._track(k)
+        if not rows:
+            self.bloom.false_positive()
+
+    def _put(self, key: bytes, first_seen: float, price: float) -> None:
+        super()._put(key, first_seen, price)
+        if self.bloom is not None:
+            self.bloom.add(key[:10])
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        rows = [(k, *self.entries[k]) for k in dict.fromkeys(self.pending) if k in self.entries]
+        with self.db:
+            self.db.executemany("INSERT INTO seen VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                                "first_seen = excluded.first_seen, last_price = excluded.last_price", rows)
+            # Read under the write lock the insert took, so no other writer
+            # can slip in between this and the bump.
+            previous = self._generation()
+            generation = self._generation(bump=True)
+        self.pending.clear()
+        if self.bloom is not None:
+            if previous != self.bloom.generation:
+                # Another process wrote keys since this filter was loaded;
+                # saving it as current would hide them from the next run.
+                self.bloom = self._rebuild_bloom(generation)
+            else:
+                self.bloom.generation = generation
+                self.bloom.save(self.bloom_path)
+            logger.info(f"Bloom filter: {self.bloom.stats}, "
+                        f"observed false-positive rate {self.bloom.false_positive_rate():.2%}")
+
+    def compact(self) -> None:
+        self.flush()
+        dropped = self.expire()
+        if self.ttl > 0:
+            with self.db:
+                cur = self.db.execute("DELETE FROM seen WHERE first_seen <= ?", (time.time() - self.ttl,))
+                dropped = max(dropped, cur.rowcount)
+                generation = self._generation(bump=True)
+            if self.bloom is not None:
+                self.bloom = self._rebuild_bloom(generation)
+        logger.info(f"Compacted seen table: {dropped} expired")
+
+class SqliteOutbox(Outbox):
+    # Same contract as the file outbox, one row per post; each call is its
+    # own transaction, so an enqueue is on disk before it returns.
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        backlog = len(self.pending())
+        if backlog:
+            logger.info(f"Outbox: {backlog} post(s) pending from an earlier run")
+
+    def enqueue(self, key: str, chat_id, text: str) -> bool:
+        with self.db:
+            cur = self.db.execute("INSERT OR IGNORE INTO outbox (key, chat_id, text, enqueued) VALUES (?, ?, ?, ?)",
+                                  (key, str(chat_id), text, time.time()))
+        return cur.rowcount > 0
+
+    def pending(self) -> list:
+        return list(self.db.execute("SELECT key, chat_id, text FROM outbox "
+                                    "WHERE sent IS NULL AND dead IS NULL ORDER BY rowid"))
+
+    def mark_sent(self, keys: list) -> None:
+        now = time.time()
+        with self.db:
+            self.db.executemany("UPDATE outbox SET sent = ? WHERE key = ?", ((now, k) for k in keys))
+
+    def mark_failed(self, keys: list, error: str, permanent: bool = False) -> None:
+        with self.db:
+            self.db.executemany("UPDATE outbox SET attempts = attempts + 1, "
+                                "dead = CASE WHEN ? OR attempts + 1 >= ? THEN ? END WHERE key = ?",
+                                ((permanent, OUTBOX_MAX_ATTEMPTS, error, k) for k in keys))
+
+    def compact(self) -> None:
+        dead = list(self.db.execute("SELECT key, chat_id, attempts, dead FROM outbox "
+                                    "WHERE sent IS NULL AND dead IS NOT NULL"))
+        for key, chat_id, attempts, error in dead:
+            logger.warning(f"Outbox: dropping post {key} to {chat_id} after {attempts} "
+                           f"failed attempt(s): {error}")
+        with self.db:
+            cur = self.db.execute("DELETE FROM outbox WHERE sent IS NOT NULL OR dead IS NOT NULL")
+        if cur.rowcount:
+            logger.info(f"Compacted outbox: {cur.rowcount - len(dead)} delivered, {len(dead)} dead-lettered")
+
+# ─── Migration from the JSON files ─────────────────────────────────────────────
+def migrate_json(db: sqlite3.Connection, data_dir: str) -> None:
+    if db.execute("SELECT 1 FROM meta WHERE name = 'migrated_json'").fetchone():
+        return
+    subs = load_json(os.path.join(data_dir, "subscriptions.json"))
+    alerts = load_json(os.path.join(data_dir, "alerts.json"))
+    settings = load_json(os.path.join(data_dir, "settings.json"))
+    notices = load_json(os.path.join(data_dir, "alert_notices.json"))
+    seen = file_seen_store(data_dir)
+    with db:
+        db.executemany("INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?)",
+                       ((uid, cat, min_d) for uid, cats in subs.items() for cat, min_d in cats.items()))
+        db.executemany("INSERT OR IGNORE INTO alerts VALUES (?, ?, ?, ?)",
+                       ((uid, item, alert_asin(item), min_d)
+                        for uid, items in alerts.items() for item, min_d in items.items()))
+        db.executemany("INSERT OR IGNORE INTO settings (chat_id, digest) VALUES (?, ?)",
+                       ((uid, int(bool(prefs.get("digest")))) for uid, prefs in settings.items()))
+        db.executemany("INSERT OR IGNORE INTO alert_notices VALUES (?, ?, ?)",
+                       ((uid, asin, bucket) for uid, asins in notices.items() for asin, bucket in asins.items()))
+        db.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?, ?)",
+                       ((k, first_seen, last_price) for k, (first_seen, last_price) in seen.entries.items()))
+        db.execute("INSERT INTO meta VALUES ('migrated_json', '1')")
+    logger.info(f"Migrated {sum(map(len, subs.values()))} subscription(s), "
+                f"{sum(map(len, alerts.values()))} alert(s) and {len(seen)} seen deal(s) to SQLite")
+
+# ─── Backend selection ─────────────────────────────────────────────────────────
+_db = {}
+
+def _sqlite(data_dir: str) -> sqlite3.Connection:
+    path = os.path.join(data_dir, STATE_DB_NAME)
+    if path not in _db:
+        _db[path] = connect(path)
+        migrate_json(_db[path], data_dir)
+    return _db[path]
+
+
+def open_state(data_dir: str):
+    if STATE_BACKEND == "sqlite":
+        return SqliteState(_sqlite(data_dir))
+    return JsonState(data_dir)
+
+
+def file_seen_store(data_dir: str) -> SeenStore:
+    legacy = (os.path.join(data_dir, "seen.log"), os.path.join(data_dir, "seen.json"))
+    return SeenStore(os.path.join(data_dir, "seen.bin"), legacy)
+
+
+def open_outbox(data_dir: str) -> Outbox:
+    if STATE_BACKEND == "sqlite":
+        return SqliteOutbox(_sqlite(data_dir))
+    return Outbox(os.path.join(data_dir, "outbox.jsonl"))
+
+
+def open_seen_store(data_dir: str) -> SeenStore:
+    if STATE_BACKEND == "sqlite":
+        return SqliteSeenStore(_sqlite(data_dir), bloom_bits=SEEN_BLOOM_BITS,
+                               bloom_path=os.path.join(data_dir, STATE_DB_NAME + ".bloom"))
+    return file_seen_store(data_dir)
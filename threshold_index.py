@@ -0,0 +1,51 @@
+# threshold_index.py
+
+from bisect import bisect_left, bisect_right
+
+# ─── Subscription threshold index ──────────────────────────────────────────────
+# Per category, the subscribers kept sorted by min_discount in two parallel
+# lists, so everyone who wants a deal at discount D is the prefix up to
+# bisect_right(thresholds, D). Built once from the stored subscriptions and
+# kept in step by subscribe()/unsubscribe() as users change them.
+class ThresholdIndex:
+    def __init__(self):
+        self.by_cat = {}     # category → (thresholds, chat ids)
+        self.current = {}    # (chat id, category) → min_discount
+
+    @classmethod
+    def from_subscriptions(cls, subs: dict) -> "ThresholdIndex":
+        index = cls()
+        for uid, cats in subs.items():
+            for cat, min_d in cats.items():
+                index.subscribe(uid, cat, min_d)
+        return index
+
+    def subscribe(self, uid: str, cat: str, min_d: int) -> None:
+        self.unsubscribe(uid, cat)
+        thresholds, uids = self.by_cat.setdefault(cat, ([], []))
+        i = bisect_right(thresholds, min_d)
+        thresholds.insert(i, min_d)
+        uids.insert(i, uid)
+        self.current[(uid, cat)] = min_d
+
+    def unsubscribe(self, uid: str, cat: str) -> bool:
+        min_d = self.current.pop((uid, cat), None)
+        if min_d is None:
+            return False
+        thresholds, uids = self.by_cat[cat]
+        lo, hi = bisect_left(thresholds, min_d), bisect_right(thresholds, min_d)
+        i = uids.index(uid, lo, hi)
+        del thresholds[i], uids[i]
+        if not uids:
+            del self.by_cat[cat]
+        return True
+
+    def categories(self) -> list:
+        return list(self.by_cat)
+
+    def subscribers(self, cat: str) -> int:
+        return len(self.by_cat.get(cat, ((), ()))[1])
+
+    def matching(self, cat: str, discount: int) -> list:
+        thresholds, uids = self.by_cat.get(cat, ([], []))
+        return uids[:bisect_right(thresholds, discount)]